@@ -3,6 +3,13 @@
 set -euo pipefail
 
 python manage.py migrate --noinput
+# the shared cache (CACHE_BACKEND=db), a no-op once it exists
+python manage.py createcachetable
+
+# the job worker, on this machine when it has no shared MEDIA_ROOT with another one
+if [ "${RUN_JOBS:-0}" = "1" ]; then
+    python manage.py run_jobs &
+fi
 
 exec gunicorn \
     --worker-tmp-dir /dev/shm \
@@ -0,0 +1,8 @@
+#!/bin/bash
+
+set -euo pipefail
+
+# the shared cache (CACHE_BACKEND=db), in case the worker starts before the app
+python manage.py createcachetable
+
+exec python manage.py run_jobs
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import importlib.util
 import os
+import tempfile
 
 import dj_database_url
 from dotenv import load_dotenv
@@ -31,11 +33,18 @@ STATIC_URL = "/static/"
 # Simplified static file serving.
 # https://warehouse.python.org/project/whitenoise/
 STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
 }
 
+# files of the export jobs, written by the job worker and downloaded from the web
+# processes, so both need this directory (or another shared "default" storage)
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.join(BASE_DIR, "media"))
+
 # to prevent unneeded migrations (django 3.2)
 # https://docs.djangoproject.com/en/3.2/releases/3.2/#customizing-type-of-auto-created-primary-keys
 DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
@@ -114,6 +123,8 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    # first, to include the queries of the other middleware
+    "zoo_checks.middleware.QueryCountMiddleware",
     "django.middleware.security.SecurityMiddleware",
     # Simplified static file serving.
     # https://warehouse.python.org/project/whitenoise/
@@ -137,6 +148,64 @@ try:
 except ImportError:
     pass
 
+# cache backend, see zoo_checks/cache.py for what is cached
+# the web workers and the job worker invalidate each other's values, so it has to
+# be shared between processes (and machines)
+# - db: CACHE_LOCATION table (default), create with `python manage.py createcachetable`
+# - redis: REDIS_URL, the default when it is set and the redis package is installed
+# - file: CACHE_LOCATION directory, shared by the processes of one machine
+# - locmem: per process, only for a single process (e.g. tests)
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_BACKEND = os.getenv(
+    "CACHE_BACKEND",
+    "redis" if REDIS_URL and importlib.util.find_spec("redis") else "db",
+)
+CACHE_LOCATIONS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "zootable"),
+    "file": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        os.path.join(tempfile.gettempdir(), "zootable_cache"),
+    ),
+    "db": ("django.core.cache.backends.db.DatabaseCache", "zootable_cache"),
+    "redis": ("django.core.cache.backends.redis.RedisCache", REDIS_URL),
+}
+_cache_backend, _cache_location = CACHE_LOCATIONS[CACHE_BACKEND]
+# room for the rosters and charts of every enclosure, animal and group, the day's
+# summaries and every user's permissions. Past it a third of the entries are culled
+# (namespace versions included, invalidating their namespace). redis has its own
+# maxmemory instead
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 20000))
+CACHES = {
+    "default": {
+        "BACKEND": _cache_backend,
+        "LOCATION": os.getenv("CACHE_LOCATION", _cache_location),
+        "KEY_PREFIX": "zootable",
+        "OPTIONS": {}
+        if CACHE_BACKEND == "redis"
+        else {"MAX_ENTRIES": CACHE_MAX_ENTRIES},
+    }
+}
+
+# warn when a request makes more queries than this (per view name, or the default)
+QUERY_COUNT_THRESHOLD = (
+    int(os.getenv("QUERY_COUNT_THRESHOLD"))
+    if os.getenv("QUERY_COUNT_THRESHOLD")
+    else None
+)
+QUERY_COUNT_THRESHOLDS = {
+    "home": int(os.getenv("QUERY_COUNT_THRESHOLD_HOME", 30)),
+    "count": int(os.getenv("QUERY_COUNT_THRESHOLD_COUNT", 200)),
+}
+
+# seconds an upload waits for confirmation before its changesets are cleaned up
+STAGED_UPLOAD_TTL = int(os.getenv("STAGED_UPLOAD_TTL", 60 * 60 * 24))
+
+# background jobs (see zoo_checks/jobs.py), in seconds
+# jobs running longer than this are failed, their worker is assumed dead
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", 60 * 60))
+# finished jobs, and their results, are deleted after this
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", 60 * 60 * 24))
+
 ROOT_URLCONF = "mysite.urls"
 
 TEMPLATES = [
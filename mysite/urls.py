@@ -19,7 +19,7 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views.generic.base import TemplateView
 
-from zoo_checks import views
+from zoo_checks import api, views
 
 urlpatterns = [
     path("manage/", admin.site.urls, name="admin"),
@@ -66,6 +66,45 @@ urlpatterns = [
     path("upload/", views.ingest_form, name="ingest_form"),
     path("confirm_upload/", views.confirm_upload, name="confirm_upload"),
     path("export/", views.export, name="export"),
+    path("jobs/<uuid:token>/", views.job_detail, name="job"),
+    path("jobs/<uuid:token>/status/", views.job_status, name="job_status"),
+    path("jobs/<uuid:token>/download/", views.job_download, name="job_download"),
+    path("api/enclosures/", api.enclosures, name="api_enclosures"),
+    path("api/animals/", api.animals, name="api_animals"),
+    path("api/groups/", api.groups, name="api_groups"),
+    path("api/species/", api.species, name="api_species"),
+    path(
+        "api/animals/<animal>/counts/",
+        api.animal_counts,
+        name="api_animal_counts",
+    ),
+    path("api/groups/<group>/counts/", api.group_counts, name="api_group_counts"),
+    path(
+        "api/species/<slug:species_slug>/<slug:enclosure_slug>/counts/",
+        api.species_counts,
+        name="api_species_counts",
+    ),
+    path(
+        "api/enclosures/<slug:enclosure_slug>/conditions/",
+        api.enclosure_conditions,
+        name="api_enclosure_conditions",
+    ),
+    path(
+        "api/animals/<animal>/conditions/",
+        api.animal_conditions,
+        name="api_animal_conditions",
+    ),
+    path(
+        "api/animals/<animal>/history/",
+        api.animal_history,
+        name="api_animal_history",
+    ),
+    path("api/groups/<group>/history/", api.group_history, name="api_group_history"),
+    path(
+        "api/species/<slug:species_slug>/<slug:enclosure_slug>/history/",
+        api.species_history,
+        name="api_species_history",
+    ),
     # for django browser reload
     path("__reload__/", include("django_browser_reload.urls")),
 ]
@@ -9,6 +9,8 @@ import string
 import pytest
 from django.contrib.messages.storage.fallback import FallbackStorage
 from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import caches
+from django.core.management import call_command
 from django.http import HttpResponse
 from django.utils.timezone import datetime, localtime, timedelta
 
@@ -25,6 +27,33 @@ from zoo_checks.models import (
 )
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """cached values can outlive the test database transaction"""
+    for cache in caches.all():
+        cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    """export job files are written in a directory of the test"""
+    settings.MEDIA_ROOT = tmp_path / "media"
+    return settings.MEDIA_ROOT
+
+
+@pytest.fixture
+def db_cache(db, settings):
+    """the deployed cache backend, a table shared by every process"""
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "zootable_test_cache",
+        }
+    }
+    call_command("createcachetable")
+    return caches["default"]
+
+
 @pytest.fixture
 def rf_get_factory(rf, user_base):
     """request factory factory
@@ -437,3 +466,28 @@ def create_many_counts(
         return a_cts, s_cts, g_cts, enc_list
 
     return _create_many_counts
+
+
+@pytest.fixture
+def formset_post_data():
+    """POST data for a rendered formset, as submitted w/o changes"""
+
+    def _formset_post_data(formset, **changes) -> dict:
+        """changes: {form index: {field name: value}}"""
+        data = {
+            formset.add_prefix(name): value
+            for name, value in formset.management_form.initial.items()
+        }
+        for ind, form in enumerate(formset):
+            for name, field in form.fields.items():
+                value = form.initial.get(name, field.initial)
+                value = getattr(value, "pk", value)
+                post_value = changes.get(str(ind), {}).get(name, value)
+                if field.show_hidden_initial:
+                    data[form.add_initial_prefix(name)] = value
+                # unchecked checkboxes are not submitted
+                if post_value is not False and post_value is not None:
+                    data[form.add_prefix(name)] = post_value
+        return data
+
+    return _formset_post_data
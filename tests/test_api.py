@@ -0,0 +1,202 @@
+import datetime as dt
+
+import pytest
+from django.urls import reverse
+from django.utils.timezone import localtime
+
+from zoo_checks.models import AnimalCount
+from zoo_checks.pagination import InvalidCursor, KeysetPaginator
+
+
+def test_keyset_paginator(animal_A, user_base, enclosure_base):
+    now = localtime()
+    # pairs with the same time are ordered by id
+    counts = AnimalCount.objects.bulk_create(
+        AnimalCount(
+            animal=animal_A,
+            user=user_base,
+            enclosure=enclosure_base,
+            condition="BA",
+            datetimecounted=now - dt.timedelta(hours=i // 2),
+            datecounted=(now - dt.timedelta(days=i)).date(),
+        )
+        for i in range(7)
+    )
+    expected = sorted(counts, key=lambda c: (c.datetimecounted, c.id), reverse=True)
+
+    paginator = KeysetPaginator(AnimalCount.objects.all(), per_page=3)
+    pages, cursor = [], None
+    while True:
+        page = paginator.page(cursor)
+        pages.append([c.id for c in page])
+        if not page.has_next():
+            break
+        cursor = page.next_cursor
+
+    assert pages == [[c.id for c in expected[i : i + 3]] for i in (0, 3, 6)]
+
+    # backwards from the last page
+    page = paginator.page(last=True)
+    assert [c.id for c in page] == [c.id for c in expected[-3:]]
+    assert not page.has_next()
+    page = paginator.page(before=page.previous_cursor)
+    assert [c.id for c in page] == [c.id for c in expected[1:4]]
+    assert page.has_previous()
+    page = paginator.page(before=page.previous_cursor)
+    assert [c.id for c in page] == [expected[0].id]
+    assert not page.has_previous()
+    assert page.has_next()
+
+    with pytest.raises(InvalidCursor):
+        paginator.page("not a cursor")
+    with pytest.raises(ValueError):
+        KeysetPaginator(AnimalCount.objects.all(), ("datetimecounted", "-id"))
+
+
+def test_api_counts(client, user_base, animal_A, animal_count_factory):
+    now = localtime()
+    counts = [animal_count_factory("BA", now - dt.timedelta(days=i)) for i in range(5)]
+    url = reverse("api_animal_counts", args=[animal_A.accession_number])
+
+    # not logged in
+    resp = client.get(url)
+    assert resp.status_code == 401
+
+    client.force_login(user_base)
+    resp = client.get(url, {"limit": 2})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert [c["id"] for c in data["results"]] == [counts[0].id, counts[1].id]
+    assert data["results"][0]["condition"] == "BA"
+    assert data["results"][0]["user"] == user_base.username
+
+    ids = [c["id"] for c in data["results"]]
+    while data["next"]:
+        data = client.get(data["next"]).json()
+        ids += [c["id"] for c in data["results"]]
+    assert ids == [c.id for c in counts]
+
+    # the ETag of an unchanged page
+    resp = client.get(url, {"limit": 2})
+    etag = resp["ETag"]
+    assert "private" in resp["Cache-Control"]
+    resp = client.get(url, {"limit": 2}, headers={"if-none-match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+
+    # changes with a new count
+    animal_count_factory("SE", now + dt.timedelta(days=1))
+    resp = client.get(url, {"limit": 2}, headers={"if-none-match": etag})
+    assert resp.status_code == 200
+    assert resp.json()["results"][0]["condition"] == "SE"
+
+    assert client.get(url, {"cursor": "nope"}).status_code == 400
+    assert client.get(url, {"limit": 0}).status_code == 400
+    assert client.post(url).status_code == 405
+    resp = client.get(reverse("api_animal_counts", args=["000000"]))
+    assert resp.status_code == 404
+
+
+def test_api_permissions(
+    client, user_factory, user_super, animal_A, animal_B_enc, group_B, species_base
+):
+    animal_B = animal_B_enc("other_enc")
+    rando_user = user_factory("rando")
+
+    # no roles
+    client.force_login(rando_user)
+    assert client.get(reverse("api_enclosures")).json()["results"] == []
+    assert client.get(reverse("api_animals")).json()["results"] == []
+    assert client.get(reverse("api_species")).json()["results"] == []
+    resp = client.get(reverse("api_animal_counts", args=[animal_A.accession_number]))
+    assert resp.status_code == 403
+    resp = client.get(
+        reverse("api_species_counts", args=[species_base.slug, animal_A.enclosure.slug])
+    )
+    assert resp.status_code == 403
+    resp = client.get(reverse("api_animals"), {"enclosure": animal_A.enclosure.slug})
+    assert resp.status_code == 403
+
+    # superusers see all enclosures
+    client.force_login(user_super)
+    data = client.get(reverse("api_enclosures")).json()
+    assert [e["slug"] for e in data["results"]] == [
+        animal_A.enclosure.slug,
+        animal_B.enclosure.slug,
+    ]
+    data = client.get(reverse("api_animals"), {"limit": 1}).json()
+    assert [a["accession_number"] for a in data["results"]] == [
+        animal_A.accession_number
+    ]
+    data = client.get(data["next"]).json()
+    assert [a["accession_number"] for a in data["results"]] == [
+        animal_B.accession_number
+    ]
+    assert data["next"] is None
+
+    data = client.get(
+        reverse("api_groups"), {"enclosure": group_B.enclosure.slug}
+    ).json()
+    assert [g["accession_number"] for g in data["results"]] == [
+        group_B.accession_number
+    ]
+    assert data["results"][0]["counts"] == reverse(
+        "api_group_counts", args=[group_B.accession_number]
+    )
+    data = client.get(reverse("api_species")).json()
+    assert [s["slug"] for s in data["results"]] == [species_base.slug]
+
+
+def test_api_history(client, user_base, user_factory, group_B, group_count_factory):
+    today = dt.date.today()
+    now = localtime()
+    for d in range(30):
+        group_count_factory(10, d, 0, 0, datetimecounted=now - dt.timedelta(days=d))
+    url = reverse("api_group_history", args=[group_B.accession_number])
+
+    client.force_login(user_factory("rando"))
+    assert client.get(url).status_code == 403
+
+    client.force_login(user_base)
+    data = client.get(url, {"bucket": "day"}).json()
+    assert data["bucket"] == "day"
+    assert data["end"] == today.isoformat()
+    assert len(data["labels"]) == 30
+    assert data["labels"][-1] == today.isoformat()
+    assert data["count_seen"][-1] == 0
+    assert data["count_total"] == [10] * 30
+
+    data = client.get(url, {"bucket": "month", "start": "2000-01-01"}).json()
+    assert data["start"] == "2000-01-01"
+    assert len(data["labels"]) in (1, 2)
+
+    assert client.get(url, {"bucket": "year"}).status_code == 400
+    assert client.get(url, {"start": "yesterday"}).status_code == 400
+    assert client.get(url, {"start": "2000-01-01"}).status_code == 400
+
+
+def test_api_conditions(
+    client, user_base, user_factory, animal_A, enclosure_base, animal_count_factory
+):
+    now = localtime()
+    animal_count_factory("BA", now)
+    animal_count_factory("SE", now - dt.timedelta(days=60))
+    url = reverse("api_animal_conditions", args=[animal_A.accession_number])
+
+    client.force_login(user_factory("rando"))
+    assert client.get(url).status_code == 403
+
+    client.force_login(user_base)
+    data = client.get(url).json()
+    assert data["days"] is None
+    assert {c["condition"]: c["count"] for c in data["conditions"]}["SE"] == 1
+    assert data["conditions"][0] == {"condition": "BA", "label": "BAR", "count": 1}
+
+    data = client.get(url, {"days": 30}).json()
+    assert data["days"] == 30
+    assert sum(c["count"] for c in data["conditions"]) == 1
+    assert client.get(url, {"days": 7}).status_code == 400
+
+    url = reverse("api_enclosure_conditions", args=[enclosure_base.slug])
+    data = client.get(url, {"days": 90}).json()
+    assert sum(c["count"] for c in data["conditions"]) == 2
@@ -0,0 +1,143 @@
+"""benchmarks of the hot views on a synthetic zoo
+
+Each benchmark asserts the number of queries (so N+1 regressions fail the build)
+and records the latency with pytest-benchmark.
+
+skip with `pytest --benchmark-skip`, compare runs with `--benchmark-autosave` and
+`--benchmark-compare`
+"""
+
+import datetime as dt
+from io import BytesIO
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from zoo_checks.export import iter_export_rows, write_xlsx
+from zoo_checks.ingest import handle_upload
+from zoo_checks.synthetic import create_zoo
+
+INPUT_EXAMPLE = "test_data/example.xlsx"
+
+# small enough to create for each test, large enough to expose N+1 queries
+ZOO_SIZE = {
+    "num_enclosures": 3,
+    "num_species": 10,
+    "num_animals": 10,
+    "num_groups": 3,
+    "years": 1,
+}
+
+ROUNDS = 5
+
+
+@pytest.fixture
+def zoo(db):
+    return create_zoo(**ZOO_SIZE, prefix="bench")
+
+
+@pytest.fixture
+def zoo_client(client, zoo):
+    client.force_login(zoo["users"][0])
+    return client
+
+
+@pytest.fixture
+def run_benchmark(benchmark):
+    """benchmarks func, asserting the number of queries of a single call"""
+
+    def _run_benchmark(func, num_queries):
+        with CaptureQueriesContext(connection) as ctx:
+            result = func()
+        assert len(ctx.captured_queries) == num_queries
+
+        benchmark.pedantic(func, rounds=ROUNDS, iterations=1)
+        return result
+
+    return _run_benchmark
+
+
+def test_benchmark_home(zoo_client, run_benchmark):
+    # the first load computes and caches the enclosure ids, summaries and roles
+    zoo_client.get("/")
+
+    resp = run_benchmark(lambda: zoo_client.get("/"), 3)
+    assert resp.status_code == 200
+
+
+def test_benchmark_count_get(zoo_client, zoo, run_benchmark):
+    enclosure = zoo["enclosures"][0]
+    url = f"/count/{enclosure.slug}/"
+    # the first load caches the roster
+    zoo_client.get(url)
+
+    resp = run_benchmark(lambda: zoo_client.get(url), 9)
+    assert resp.status_code == 200
+
+
+def test_benchmark_count_post(zoo_client, zoo, run_benchmark, formset_post_data):
+    enclosure = zoo["enclosures"][0]
+    url = f"/count/{enclosure.slug}/"
+
+    resp = zoo_client.get(url)
+    data = {
+        **formset_post_data(
+            resp.context["animals_formset"],
+            **{str(i): {"condition": "SE"} for i in range(ZOO_SIZE["num_animals"])},
+        ),
+        **formset_post_data(resp.context["groups_formset"], **{"0": {"count_seen": 1}}),
+        **formset_post_data(resp.context["species_formset"]),
+    }
+
+    # the hidden form fields are validated against the roster, not a query each
+    resp = run_benchmark(lambda: zoo_client.post(url, data), 15)
+    assert resp.status_code == 302
+
+
+def test_benchmark_animal_counts(zoo_client, zoo, run_benchmark):
+    animal = zoo["animals"][0]
+
+    resp = run_benchmark(
+        lambda: zoo_client.get(f"/animal_counts/{animal.accession_number}"), 6
+    )
+    assert resp.status_code == 200
+
+
+def test_benchmark_group_counts(zoo_client, zoo, run_benchmark):
+    group = zoo["groups"][0]
+
+    resp = run_benchmark(
+        lambda: zoo_client.get(f"/group_counts/{group.accession_number}"), 6
+    )
+    assert resp.status_code == 200
+
+
+def test_benchmark_species_counts(zoo_client, zoo, run_benchmark):
+    animal = zoo["animals"][0]
+    species, enclosure = animal.species, animal.enclosure
+
+    resp = run_benchmark(
+        lambda: zoo_client.get(f"/species_counts/{species.slug}/{enclosure.slug}"),
+        7,
+    )
+    assert resp.status_code == 200
+
+
+def test_benchmark_export(zoo, run_benchmark):
+    """the export job, without the job table"""
+    today = dt.date.today()
+    start_date = today - dt.timedelta(days=30)
+
+    def export():
+        output = BytesIO()
+        write_xlsx(iter_export_rows(zoo["enclosures"], start_date, today), output)
+        return output.getvalue()
+
+    xlsx = run_benchmark(export, 1)
+    assert xlsx.startswith(b"PK")
+
+
+def test_benchmark_handle_upload(db, run_benchmark):
+    changesets = run_benchmark(lambda: handle_upload(INPUT_EXAMPLE), 6)
+    assert changesets["animals"]
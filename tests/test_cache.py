@@ -0,0 +1,163 @@
+"""test caching"""
+
+from django.core.cache import caches
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import localtime, timedelta
+
+from zoo_checks.cache import (
+    get_accessible_enclosure_ids,
+    get_roster,
+    get_user_roles,
+    invalidate_rosters,
+    make_key,
+    roster_version,
+    version_key,
+)
+from zoo_checks.models import AnimalCount, User
+
+
+def test_get_roster(enclosure_base, animal_A, group_B, django_assert_num_queries):
+    # species, animals, groups
+    with django_assert_num_queries(3):
+        roster = get_roster(enclosure_base)
+    assert roster["animals"] == [animal_A]
+    assert roster["groups"] == [group_B]
+    assert roster["species"] == [animal_A.species]
+
+    with django_assert_num_queries(0):
+        assert get_roster(enclosure_base) == roster
+
+
+def test_roster_invalidation(
+    enclosure_base,
+    animal_A,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    get_roster(enclosure_base)
+    version = roster_version()
+
+    # saving an animal changes the version, once it is committed
+    with django_capture_on_commit_callbacks(execute=True):
+        animal_A.active = False
+        animal_A.save()
+        assert roster_version() == version
+    assert roster_version() != version
+    assert get_roster(enclosure_base)["animals"] == []
+
+    version = roster_version()
+    invalidate_rosters()
+    assert roster_version() != version
+    with django_assert_num_queries(3):
+        get_roster(enclosure_base)
+
+
+def test_shared_cache(db_cache, enclosure_base, animal_A):
+    """another process (its own cache connection) sees the invalidation"""
+    other_process = caches.create_connection("default")
+    roster = get_roster(enclosure_base)
+    assert other_process.get(make_key("roster", enclosure_base.id)) == roster
+
+    invalidate_rosters()
+    assert other_process.get(version_key("roster")) == roster_version()
+
+
+def test_request_versions(db_cache, client, user_base, enclosure_base, animal_A):
+    """a request reads each namespace version from the shared cache once"""
+    client.force_login(user_base)
+    # caches the enclosure ids, summaries and permissions
+    client.get(reverse("home"))
+
+    with CaptureQueriesContext(connection) as ctx:
+        client.get(reverse("home"))
+    cache_queries = [
+        q["sql"] for q in ctx.captured_queries if "zootable_test_cache" in q["sql"]
+    ]
+    # the roles and the accessible enclosures share the permissions version
+    for namespace in ("roster", "summary", "permissions"):
+        assert sum(f"{namespace}:version" in sql for sql in cache_queries) == 1
+
+    # outside of requests the version is read each time
+    with CaptureQueriesContext(connection) as ctx:
+        get_roster(enclosure_base)
+        get_roster(enclosure_base)
+    assert sum("roster:version" in q["sql"] for q in ctx.captured_queries) == 2
+
+
+def test_chart_data_cache(
+    client,
+    user_base,
+    animal_A,
+    animal_count_factory,
+    django_capture_on_commit_callbacks,
+):
+    client.force_login(user_base)
+    url = f"/animal_counts/{animal_A.accession_number}"
+
+    animal_count_factory("SE")
+    resp = client.get(url)
+    assert resp.context["chart_data"] == [0, 1, 0, 0, 0]
+
+    # a new count of the animal refreshes the chart
+    with django_capture_on_commit_callbacks(execute=True):
+        animal_count_factory("BA", localtime() - timedelta(days=1))
+    resp = client.get(url)
+    assert resp.context["chart_data"] == [1, 1, 0, 0, 0]
+
+    # as does a count form, once the counts are committed
+    with django_capture_on_commit_callbacks(execute=True):
+        AnimalCount(
+            condition="NA",
+            animal=animal_A,
+            user=user_base,
+            enclosure=animal_A.enclosure,
+        ).update_or_create_from_form()
+        assert client.get(url).context["chart_data"] == [1, 1, 0, 0, 0]
+    resp = client.get(url)
+    assert resp.context["chart_data"] == [1, 0, 1, 0, 0]
+
+
+def test_user_roles_cache(
+    user_base, role_base, django_assert_num_queries, django_capture_on_commit_callbacks
+):
+    assert get_user_roles(user_base) == [role_base]
+    with django_assert_num_queries(0):
+        assert get_user_roles(user_base) == [role_base]
+
+    # removing the user from the role invalidates, once committed
+    with django_capture_on_commit_callbacks(execute=True):
+        role_base.users.remove(user_base)
+    assert get_user_roles(user_base) == []
+
+
+def test_accessible_enclosure_ids(
+    user_base,
+    role_base,
+    enclosure_base,
+    enclosure_factory,
+    django_assert_num_queries,
+    django_capture_on_commit_callbacks,
+):
+    assert get_accessible_enclosure_ids(user_base) == {enclosure_base.id}
+
+    # memoized on the user for the request
+    with django_assert_num_queries(0):
+        get_accessible_enclosure_ids(user_base)
+
+    # and cached for the next request
+    user = User.objects.get(id=user_base.id)
+    with django_assert_num_queries(0):
+        assert get_accessible_enclosure_ids(user) == {enclosure_base.id}
+
+    # changing the role's enclosures invalidates the cache
+    with django_capture_on_commit_callbacks(execute=True):
+        other_enc = enclosure_factory("other_enc")  # added to role_base
+    user = User.objects.get(id=user_base.id)
+    assert get_accessible_enclosure_ids(user) == {enclosure_base.id, other_enc.id}
+
+    with django_capture_on_commit_callbacks(execute=True):
+        role_base.users.remove(user_base)
+    user = User.objects.get(id=user_base.id)
+    assert get_accessible_enclosure_ids(user) == frozenset()
@@ -0,0 +1,127 @@
+import datetime as dt
+
+import pytest
+from django.utils import timezone
+
+from zoo_checks.charts import (
+    CHART_LENGTH,
+    condition_distribution,
+    group_chart_data,
+    history_range,
+    history_series,
+    species_chart_data,
+)
+from zoo_checks.models import AnimalCount, GroupCount, SpeciesCount
+
+
+def test_group_chart_data(group_B, group_count_factory, django_assert_num_queries):
+    now = timezone.localtime()
+    for d in range(CHART_LENGTH + 5):
+        group_count_factory(5, d % 3, 0, 2, datetimecounted=now - dt.timedelta(days=d))
+    counts = list(GroupCount.objects.filter(group=group_B).order_by("-datetimecounted"))
+
+    with django_assert_num_queries(1):
+        chart = group_chart_data(
+            GroupCount.objects.filter(group=group_B).order_by("-datetimecounted", "-id")
+        )
+
+    last = counts[:CHART_LENGTH]
+    assert chart["chart_labels_line"] == [
+        c.datecounted.strftime("%m-%d-%Y") for c in last
+    ]
+    assert chart["chart_data_line_total"] == [c.count_total for c in last]
+    assert chart["chart_data_line_seen"] == [c.count_seen for c in last]
+    assert chart["chart_data_line_bar"] == [c.count_bar for c in last]
+    assert chart["chart_labels_pie"] == [0, 1, 2]
+    assert chart["chart_data_pie"] == [
+        [c.count_seen for c in last].count(s) for s in (0, 1, 2)
+    ]
+
+
+def test_species_chart_data(
+    species_base, enclosure_base, species_count_factory, django_assert_num_queries
+):
+    now = timezone.localtime()
+    for d in range(CHART_LENGTH + 5):
+        species_count_factory(d % 4, datetimecounted=now - dt.timedelta(days=d))
+
+    counts_query = SpeciesCount.objects.filter(
+        species=species_base, enclosure=enclosure_base
+    ).order_by("-datetimecounted", "-id")
+    with django_assert_num_queries(1):
+        chart = species_chart_data(counts_query)
+
+    # the last 100, oldest first
+    last = list(counts_query[:CHART_LENGTH])[::-1]
+    assert chart["chart_labels_line"] == [
+        c.datecounted.strftime("%m-%d-%Y") for c in last
+    ]
+    assert chart["chart_data_line_total"] == [c.count for c in last]
+    assert chart["chart_labels_pie"] == [0, 1, 2, 3]
+    assert sum(chart["chart_data_pie"]) == CHART_LENGTH
+
+
+def test_history_series(animal_A, animal_count_factory, django_assert_num_queries):
+    # a monday and the rest of its week, then the next monday
+    monday = timezone.localtime().replace(hour=12) - dt.timedelta(
+        days=timezone.localdate().weekday() + 14
+    )
+    for d, condition in enumerate(["BA", "SE", "NA", "NS", "BA", "SE", "NA", "BA"]):
+        animal_count_factory(condition, monday + dt.timedelta(days=d))
+
+    counts_query = AnimalCount.objects.filter(animal=animal_A)
+    start, end = monday.date(), monday.date() + dt.timedelta(days=7)
+    with django_assert_num_queries(1):
+        weekly = history_series(counts_query, "week", start, end)
+    # the latest count of each week
+    assert weekly["labels"] == [start.isoformat(), end.isoformat()]
+    assert weekly["condition"] == ["NA", "BA"]
+
+    daily = history_series(counts_query, "day", start, end)
+    assert len(daily["labels"]) == 8
+    assert daily["condition"][:2] == ["BA", "SE"]
+
+    monthly = history_series(counts_query, "month", start, end)
+    assert monthly["labels"][0] == start.replace(day=1).isoformat()
+
+
+def test_history_range():
+    today = timezone.localdate()
+    assert history_range("day") == (today - dt.timedelta(days=100), today)
+    assert history_range("month", end_date=dt.date(2020, 1, 1))[1] == dt.date(
+        2020, 1, 1
+    )
+
+    with pytest.raises(ValueError):
+        history_range("year")
+    with pytest.raises(ValueError):
+        history_range("day", today, today - dt.timedelta(days=1))
+    # too many buckets
+    with pytest.raises(ValueError):
+        history_range("day", today - dt.timedelta(days=5 * 365))
+    assert history_range("month", today - dt.timedelta(days=5 * 365))
+
+
+def test_condition_distribution(
+    animal_A, animal_count_factory, django_assert_num_queries
+):
+    now = timezone.localtime()
+    for d, condition in ((0, "BA"), (1, "BA"), (40, "SE"), (100, "NA"), (400, "NS")):
+        animal_count_factory(condition, now - dt.timedelta(days=d))
+    counts_query = AnimalCount.objects.filter(animal=animal_A)
+
+    # every condition, from one query
+    with django_assert_num_queries(1):
+        distribution = condition_distribution(counts_query)
+    assert list(distribution) == [c for c, _ in AnimalCount.CONDITIONS]
+    assert distribution == {"BA": 2, "SE": 1, "NA": 1, "NS": 1, "": 0}
+
+    assert condition_distribution(counts_query, 30) == {
+        "BA": 2,
+        "SE": 0,
+        "NA": 0,
+        "NS": 0,
+        "": 0,
+    }
+    assert sum(condition_distribution(counts_query, 90).values()) == 3
+    assert sum(condition_distribution(counts_query, 365).values()) == 4
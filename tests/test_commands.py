@@ -0,0 +1,98 @@
+"""test management commands"""
+
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from zoo_checks.cache import get_roster
+from zoo_checks.models import (
+    AnimalCount,
+    DailyEnclosureSummary,
+    Enclosure,
+    Job,
+    StagedUpload,
+)
+
+
+@pytest.mark.django_db
+def test_benchmark_count_indexes():
+    out = StringIO()
+    call_command(
+        "benchmark_count_indexes",
+        years=1,
+        enclosures=2,
+        animals=3,
+        groups=1,
+        repeat=1,
+        stdout=out,
+    )
+
+    output = out.getvalue()
+    assert "2190 animal counts" in output
+    assert "animal prior counts" in output
+
+    # everything is rolled back
+    assert not Enclosure.objects.exists()
+    assert not AnimalCount.objects.exists()
+
+
+@pytest.mark.django_db
+def test_generate_zoo():
+    out = StringIO()
+    call_command(
+        "generate_zoo",
+        years=1,
+        enclosures=2,
+        species=4,
+        animals=3,
+        groups=1,
+        users=2,
+        prefix="gen",
+        stdout=out,
+    )
+
+    output = out.getvalue()
+    assert "2 enclosures" in output
+    assert "2190 animal counts" in output
+    assert Enclosure.objects.filter(name__startswith="gen ").count() == 2
+    assert AnimalCount.objects.count() == 2190
+
+
+def test_zoo_cache(enclosure_base, animal_A, django_assert_num_queries):
+    out = StringIO()
+    call_command("zoo_cache", "warm", stdout=out)
+    assert "Warmed the cache for 1 enclosures" in out.getvalue()
+
+    with django_assert_num_queries(0):
+        get_roster(enclosure_base)
+        DailyEnclosureSummary.for_enclosures([enclosure_base])
+
+    call_command("zoo_cache", "clear", stdout=out)
+    with django_assert_num_queries(3):
+        get_roster(enclosure_base)
+
+
+@pytest.mark.django_db
+def test_cleanup_staged_uploads(settings):
+    StagedUpload.stage({"animals": []}, "kept.xlsx")
+    settings.STAGED_UPLOAD_TTL = -1
+    StagedUpload.stage({"animals": []}, "expired.xlsx")
+
+    out = StringIO()
+    call_command("cleanup_staged_uploads", stdout=out)
+    assert "Deleted 1 expired staged uploads" in out.getvalue()
+    assert [s.upload_file for s in StagedUpload.objects.all()] == ["kept.xlsx"]
+
+
+@pytest.mark.django_db
+def test_run_jobs():
+    job = Job.enqueue(
+        "export",
+        {"enclosure_ids": [], "start_date": "2021-01-01", "end_date": "2021-01-02"},
+    )
+
+    out = StringIO()
+    call_command("run_jobs", "--burst", stdout=out)
+    assert f"export job {job.token}: failed" in out.getvalue()
+    assert "Ran 1 jobs" in out.getvalue()
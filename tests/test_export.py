@@ -0,0 +1,251 @@
+import csv
+import datetime as dt
+import gzip
+import math
+from io import BytesIO, StringIO
+
+import openpyxl
+import pandas as pd
+import pytest
+from django.conf import settings
+
+from zoo_checks.export import (
+    EXPORT_COLUMNS,
+    get_export_df,
+    get_export_querysets,
+    iter_export_rows,
+    stream_csv,
+    stream_csv_gzip,
+    write_arrow,
+    write_parquet,
+    write_xlsx,
+)
+from zoo_checks.synthetic import create_zoo
+
+
+def qs_to_df(qs, fields):
+    """Takes a queryset and outputs a dataframe"""
+
+    field_names = []
+    field_name_constructor = "{}__{}"
+    for f in fields:
+        if f.is_relation:
+            if f.name == "enclosure":
+                field_names.append(field_name_constructor.format(f.name, "name"))
+            elif f.name == "user":
+                field_names.append(field_name_constructor.format(f.name, "username"))
+            elif f.name in ("animal", "group"):
+                field_names.extend(
+                    [
+                        field_name_constructor.format(f.name, "accession_number"),
+                        field_name_constructor.format(f.name, "species__class_name"),
+                        field_name_constructor.format(f.name, "species__order_name"),
+                        field_name_constructor.format(f.name, "species__family_name"),
+                        field_name_constructor.format(f.name, "species__genus_name"),
+                        field_name_constructor.format(f.name, "species__species_name"),
+                        field_name_constructor.format(f.name, "species__common_name"),
+                    ]
+                )
+            elif f.name == "species":
+                field_names.extend(
+                    [
+                        field_name_constructor.format(f.name, "class_name"),
+                        field_name_constructor.format(f.name, "order_name"),
+                        field_name_constructor.format(f.name, "family_name"),
+                        field_name_constructor.format(f.name, "genus_name"),
+                        field_name_constructor.format(f.name, "species_name"),
+                        field_name_constructor.format(f.name, "common_name"),
+                    ]
+                )
+        else:
+            field_names.append(f.name)
+
+    queryset_vals = qs.values(*field_names)
+    df = pd.DataFrame(queryset_vals)
+
+    return df
+
+
+def clean_df(df):
+    """cleans the counts dataframe for export to excel, as the export view did"""
+
+    if "id" in df.columns:
+        df = df.drop(columns=["id"])
+
+    # remove timezone from datetimes
+    # convert times to app's timezone
+    # get only time string
+    if "datetimecounted" in df.columns:
+        df["time_counted"] = (
+            df["datetimecounted"]
+            .dt.tz_convert(settings.TIME_ZONE)
+            .dt.tz_localize(None)
+            .dt.strftime("%H:%M:%S")
+        )
+    df = df.drop(columns=["datetimecounted"])
+
+    # combining columns for species
+    items = (
+        "common_name",
+        "class_name",
+        "order_name",
+        "family_name",
+        "genus_name",
+        "species_name",
+    )
+    for item in items:
+        cols = [
+            f"species__{item}",
+            f"animal__species__{item}",
+            f"group__species__{item}",
+        ]
+        cols = [c for c in cols if c in df.columns]
+        df[f"{item}"] = df[cols].apply(
+            lambda row: "".join(row.dropna().astype(str)), axis=1
+        )
+        df = df.drop(columns=cols)
+
+    # combining accession_number
+    cols = ["animal__accession_number", "group__accession_number"]
+    cols = [c for c in cols if c in df.columns]
+    df["accession_number"] = df[cols].apply(
+        lambda row: "".join(row.dropna().astype(str)), axis=1
+    )
+    df = df.drop(columns=cols)
+
+    # making col names prettier
+    rename_cols = {
+        "enclosure__name": "enclosure",
+        "user__username": "user",
+        "datecounted": "date_counted",
+    }
+    df = df.rename(columns=rename_cols)
+
+    # sorting the values
+    df = df.sort_values(
+        by=["enclosure", "date_counted", "time_counted", "species_name"]
+    )
+
+    # sorting the columns
+    cols = df.columns.to_list()
+    cols_front = [
+        "enclosure",
+        "date_counted",
+        "time_counted",
+        "class_name",
+        "order_name",
+        "family_name",
+        "genus_name",
+        "species_name",
+        "common_name",
+    ]
+    [cols.remove(c) for c in cols_front]
+    df = df[cols_front + cols]
+
+    return df
+
+
+def pandas_export_df(enclosures, start_date, end_date):
+    """the export as it was built in pandas, from a query for each count type"""
+    df = pd.concat(
+        [
+            qs_to_df(qs, qs.model._meta.fields)
+            for qs in get_export_querysets(enclosures, start_date, end_date)
+        ],
+        ignore_index=True,
+        sort=False,
+    )
+    return clean_df(df)
+
+
+def df_rows(df):
+    """rows of the dataframe with None for missing values and int counts"""
+    return [
+        [
+            None
+            if isinstance(v, float) and math.isnan(v)
+            else int(v)
+            if isinstance(v, float)
+            else v
+            for v in row
+        ]
+        for row in df.values.tolist()
+    ]
+
+
+def test_iter_export_rows(db, django_assert_num_queries):
+    zoo = create_zoo(
+        num_enclosures=3, num_species=5, num_animals=5, num_groups=3, years=1
+    )
+    end_date = dt.date.today()
+    start_date = end_date - dt.timedelta(days=30)
+    df = pandas_export_df(zoo["enclosures"], start_date, end_date)
+
+    # one query, read in many chunks
+    with django_assert_num_queries(1):
+        rows = list(
+            iter_export_rows(zoo["enclosures"], start_date, end_date, chunk_size=7)
+        )
+
+    # the same rows as the dataframe, sorted the same way
+    expected = df_rows(df)
+    assert list(df.columns) == EXPORT_COLUMNS
+    assert sorted(map(repr, rows)) == sorted(map(repr, expected))
+
+    def sort_key(row):
+        return row[0], row[1], row[2], row[7]
+
+    assert [sort_key(r) for r in rows] == [sort_key(r) for r in expected]
+
+    assert df_rows(get_export_df(zoo["enclosures"], start_date, end_date)) == rows
+
+    # csv
+    lines = list(csv.reader(StringIO("".join(stream_csv(iter(rows))))))
+    assert lines[0] == EXPORT_COLUMNS
+    assert len(lines) == len(rows) + 1
+    assert gzip.decompress(b"".join(stream_csv_gzip(iter(rows)))).decode() == "".join(
+        stream_csv(iter(rows))
+    )
+
+    # xlsx
+    output = BytesIO()
+    assert write_xlsx(iter(rows), output) == len(rows)
+    sheet = openpyxl.load_workbook(output).active
+    assert [c.value for c in sheet[1]] == EXPORT_COLUMNS
+    assert sheet.max_row == len(rows) + 1
+
+
+def test_write_arrow_parquet(db):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    zoo = create_zoo(
+        num_enclosures=2, num_species=3, num_animals=3, num_groups=2, years=1
+    )
+    end_date = dt.date.today()
+    start_date = end_date - dt.timedelta(days=10)
+    rows = list(iter_export_rows(zoo["enclosures"], start_date, end_date))
+    assert rows
+
+    output = BytesIO()
+    assert write_parquet(iter(rows), output) == len(rows)
+    output.seek(0)
+    parquet_table = pq.read_table(output)
+
+    output = BytesIO()
+    assert write_arrow(iter(rows), output) == len(rows)
+    arrow_table = pa.ipc.open_stream(output.getvalue()).read_all()
+
+    for table in (parquet_table, arrow_table):
+        assert table.column_names == EXPORT_COLUMNS
+        assert table.num_rows == len(rows)
+        assert pa.types.is_dictionary(table.schema.field("enclosure").type)
+        assert pa.types.is_dictionary(table.schema.field("condition").type)
+        assert table.schema.field("date_counted").type == pa.date32()
+        assert table.schema.field("count_seen").type == pa.int16()
+        assert table.schema.field("needs_attn").type == pa.bool_()
+
+        df = table.to_pandas()
+        assert list(df["date_counted"]) == [r[1] for r in rows]
+        assert [t.isoformat() for t in df["time_counted"]] == [r[2] for r in rows]
+        assert list(df["enclosure"].astype(str)) == [r[0] for r in rows]
@@ -1,7 +1,11 @@
 import pandas as pd
 import pytest
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
+from zoo_checks.cache import roster_version
+from zoo_checks.helpers import today_time
 from zoo_checks.ingest import (
     ExcelUploadError,
     create_animals,
@@ -9,14 +13,13 @@ from zoo_checks.ingest import (
     create_groups,
     create_species,
     find_animals_groups,
-    get_animal_attributes,
     get_changesets,
     handle_upload,
     ingest_changesets,
     read_xlsx_data,
     validate_accession_numbers,
 )
-from zoo_checks.models import Animal, Enclosure, Group, Species
+from zoo_checks.models import Animal, DailyEnclosureSummary, Enclosure, Group, Species
 
 INPUT_EXAMPLE = "test_data/example.xlsx"
 INPUT_EMPTY = "test_data/empty_data.xlsx"
@@ -109,32 +112,6 @@ def test_create_animals():
             Animal.objects.get(accession_number=acc_num)
 
 
-def test_get_animal_attributes(enclosure_base, species_base):
-    data = {
-        "Accession": "211111",
-        "Internal  House  Name": "Doug",  # name
-        "Tag /Band": "Yellow",  # identifier
-        "Enclosure": enclosure_base.name,
-        "Common": species_base.common_name,
-        "Sex": None,
-        "Population _Male": 1,
-        "Population _Female": 0,
-        "Population _Unknown": 0,
-    }
-
-    df = pd.DataFrame(data, index=[0])
-    row = df.iloc[0]
-    attributes = get_animal_attributes(row)
-
-    assert attributes["accession_number"] == "211111"
-    assert attributes["name"] == "Doug"
-    assert attributes["identifier"] == "Yellow"
-    assert attributes["active"] is True
-    assert attributes["sex"] == "M"
-    assert attributes["enclosure"] == enclosure_base
-    assert attributes["species"] == species_base
-
-
 def test_find_animals_groups():
     cols = ["Population _Male", "Population _Female", "Population _Unknown"]
     nums = [[0, 1, 0], [1, 0, 1], [1, 0, 0], [0, 0, 1]]
@@ -232,12 +209,17 @@ def test_handle_upload(animal_B_enc):
 
 
 @pytest.mark.django_db
-def test_ingest_changesets():
+def test_ingest_changesets(django_capture_on_commit_callbacks):
     """Test example ingest from df"""
 
     df = read_xlsx_data(INPUT_EXAMPLE)
     ch_s = get_changesets(df)
-    ingest_changesets(ch_s)
+    version = roster_version()
+    with django_capture_on_commit_callbacks(execute=True):
+        ingest_changesets(ch_s)
+        # the cache is invalidated once the ingest is committed
+        assert roster_version() == version
+    assert roster_version() != version
 
     accession_nums = df["Accession"]
     for accession_num in accession_nums:
@@ -258,13 +240,21 @@ def test_ingest_changesets():
     # only animals
     df = read_xlsx_data(ONLY_ANIMALS_EXAMPLE)
     ch_s = get_changesets(df)
-    ingest_changesets(ch_s)
+    with django_capture_on_commit_callbacks(execute=True):
+        ingest_changesets(ch_s)
 
     accession_nums = df["Accession"]
     for accession_num in accession_nums:
         # this would raise an exception if it didn't find one
         Animal.objects.get(accession_number=accession_num)
 
+    # today's summaries reflect the new populations
+    enclosure = Enclosure.objects.get(name=df["Enclosure"].iloc[0])
+    summary = DailyEnclosureSummary.objects.get(
+        enclosure=enclosure, date=today_time().date()
+    )
+    assert summary.total_animals == enclosure.animals.filter(active=True).count()
+
     # empty: making sure we don't raise any exceptions
     df = read_xlsx_data(INPUT_EXAMPLE)
     df_empty = df[0:0]
@@ -295,11 +285,11 @@ def test_group_becomes_individuals():
     # get_changesets on that dataframe
     changeset = get_changesets(df)
 
-    # assert we are adding an individual
+    # assert we are switching the group to an individual
     animal_changes_accession = [
         ch_a["object_kwargs"]["Accession"]
         for ch_a in changeset["animals"]
-        if ch_a["action"] == "add"
+        if ch_a["action"] == "switch"
     ]
     assert accession in animal_changes_accession
 
@@ -336,11 +326,11 @@ def test_individual_becomes_group():
     # get_changesets on that dataframe
     changeset = get_changesets(df)
 
-    # assert we are adding a group
+    # assert we are switching the individual to a group
     add_accession = [
         ch_a["object_kwargs"]["Accession"]
         for ch_a in changeset["groups"]
-        if ch_a["action"] == "add"
+        if ch_a["action"] == "switch"
     ]
     assert accession in add_accession
 
@@ -351,3 +341,77 @@ def test_individual_becomes_group():
         if ch_a["action"] == "del"
     ]
     assert accession in del_accession
+
+    ingest_changesets(changeset)
+    assert not Animal.objects.get(accession_number=accession).active
+    assert Group.objects.get(accession_number=accession).active
+
+
+@pytest.mark.django_db
+def test_ingest_changesets_num_queries():
+    """the number of queries doesn't depend on the number of rows"""
+    df = read_xlsx_data(INPUT_EXAMPLE)
+
+    # ten times the rows, with new accession numbers
+    df_large = pd.concat([df] * 10, ignore_index=True)
+    df_large["Accession"] = [f"{900000 + i}" for i in df_large.index]
+
+    num_queries = []
+    for data in (df, df_large):
+        Enclosure.objects.all().delete()
+        Species.objects.all().delete()
+        ch_s = get_changesets(data)
+        with CaptureQueriesContext(connection) as ctx:
+            ingest_changesets(ch_s)
+        num_queries.append(len(ctx.captured_queries))
+
+    assert num_queries[0] == num_queries[1]
+    assert Animal.objects.count() + Group.objects.count() == len(df_large.index)
+
+
+@pytest.mark.django_db
+def test_get_changesets_diff():
+    df = read_xlsx_data(INPUT_EXAMPLE)
+    ingest_changesets(get_changesets(df))
+
+    # nothing changed
+    ch_s = get_changesets(df)
+    actions = {ch_a["action"] for ch_a in ch_s["animals"] + ch_s["groups"]}
+    assert actions == {"unchanged"}
+
+    # one animal renamed and one group's population changed
+    df.loc[df["Accession"] == "111111", "Internal  House  Name"] = "new name"
+    df.loc[df["Accession"] == "111112", "Population _Male"] += 1
+    ch_s = get_changesets(df)
+
+    (anim_update,) = [ch_a for ch_a in ch_s["animals"] if ch_a["action"] == "update"]
+    assert anim_update["object_kwargs"]["Accession"] == "111111"
+    assert anim_update["changes"] == {
+        "name": {
+            "before": Animal.objects.get(accession_number="111111").name,
+            "after": "new name",
+        }
+    }
+    assert len([ch_a for ch_a in ch_s["animals"] if ch_a["action"] == "unchanged"]) == 3
+
+    (grp_update,) = ch_s["groups"]
+    assert grp_update["action"] == "update"
+    assert list(grp_update["changes"]) == ["population_male"]
+    pop = Group.objects.get(accession_number="111112").population_male
+    assert grp_update["changes"]["population_male"] == {
+        "before": pop,
+        "after": pop + 1,
+    }
+
+    # only the changed rows are written
+    with CaptureQueriesContext(connection) as ctx:
+        ingest_changesets(ch_s)
+    assert Animal.objects.get(accession_number="111111").name == "new name"
+    assert Group.objects.get(accession_number="111112").population_male == pop + 1
+    (anim_write,) = [
+        q["sql"]
+        for q in ctx.captured_queries
+        if q["sql"].startswith('UPDATE "zoo_checks_animal"')
+    ]
+    anim = Animal.objects.get(accession_number="111111")
+    assert anim_write.endswith(f'"zoo_checks_animal"."id" IN ({anim.id})')
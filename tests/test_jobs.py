@@ -0,0 +1,127 @@
+import datetime as dt
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from zoo_checks.ingest import get_changesets, read_xlsx_data
+from zoo_checks.jobs import run_next_job, run_pending
+from zoo_checks.models import Animal, Job, StagedUpload
+
+INPUT_EXAMPLE = "test_data/example.xlsx"
+
+
+@pytest.mark.django_db
+def test_claim_next():
+    assert Job.claim_next() is None
+
+    first = Job.enqueue("export", {})
+    second = Job.enqueue("export", {})
+
+    job = Job.claim_next()
+    assert job == first
+    assert job.status == Job.RUNNING
+    assert job.started is not None
+
+    # running jobs are not claimed again
+    assert Job.claim_next() == second
+    assert Job.claim_next() is None
+
+
+def test_run_ingest(user_super):
+    changesets = get_changesets(read_xlsx_data(INPUT_EXAMPLE))
+    staged = StagedUpload.stage(changesets, "example.xlsx", user_super)
+    job = Job.enqueue("ingest", {"staged_upload": str(staged.token)}, user_super)
+
+    assert run_next_job() == job
+    job.refresh_from_db()
+    assert job.status == Job.SUCCEEDED
+    assert job.progress == job.total == 2
+    assert job.result == {
+        "upload_file": "example.xlsx",
+        "enclosures": 1,
+        "animals": {"add": 4},
+        "groups": {"add": 1},
+    }
+    assert Animal.objects.filter(accession_number="111111").exists()
+    assert not StagedUpload.objects.exists()
+
+    # the staged upload is gone
+    job = Job.enqueue("ingest", {"staged_upload": str(staged.token)}, user_super)
+    run_pending()
+    job.refresh_from_db()
+    assert job.status == Job.FAILED
+    assert "upload the file again" in job.error
+    assert job.finished is not None
+
+
+def test_run_export_no_data(enclosure_base, user_base):
+    today = dt.date.today()
+    job = Job.enqueue(
+        "export",
+        {
+            "enclosure_ids": [enclosure_base.id],
+            "start_date": today.isoformat(),
+            "end_date": today.isoformat(),
+        },
+        user_base,
+    )
+
+    assert run_pending() == 1
+    job.refresh_from_db()
+    assert job.status == Job.FAILED
+    assert job.error == "No data in range"
+    assert not job.result_filename
+
+
+def test_run_export_parquet(animal_count_A_BAR_datetime_factory, user_base):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    count = animal_count_A_BAR_datetime_factory()
+    today = dt.date.today()
+    job = Job.enqueue(
+        "export",
+        {
+            "enclosure_ids": [count.enclosure_id],
+            "start_date": (today - dt.timedelta(days=1)).isoformat(),
+            "end_date": today.isoformat(),
+            "export_format": "parquet",
+        },
+        user_base,
+    )
+
+    assert run_pending() == 1
+    job.refresh_from_db()
+    assert job.status == Job.SUCCEEDED
+    assert job.result == {"rows": 1}
+    assert job.result_filename.endswith(".parquet")
+    with job.result_file.open("rb") as f:
+        table = pq.read_table(f)
+    assert table.column("accession_number").to_pylist() == [
+        count.animal.accession_number
+    ]
+
+
+@pytest.mark.django_db
+def test_cleanup(settings):
+    settings.JOB_TIMEOUT = 60
+    settings.JOB_RESULT_TTL = 60
+    long_ago = timezone.now() - timezone.timedelta(minutes=5)
+
+    queued = Job.enqueue("export", {})
+    stale = Job.enqueue("export", {})
+    Job.objects.filter(id=stale.id).update(status=Job.RUNNING, started=long_ago)
+    old = Job.enqueue("export", {})
+    old.result_file.save("old.xlsx", ContentFile(b"export"))
+    Job.objects.filter(id=old.id).update(status=Job.SUCCEEDED, finished=long_ago)
+    assert default_storage.exists(old.result_file.name)
+
+    assert Job.cleanup() == 1
+    assert not Job.objects.filter(id=old.id).exists()
+    # with its file
+    assert not default_storage.exists(old.result_file.name)
+    assert Job.objects.get(id=queued.id).status == Job.QUEUED
+    stale.refresh_from_db()
+    assert stale.status == Job.FAILED
+    assert stale.error == "Timed out"
@@ -0,0 +1,86 @@
+import datetime as dt
+import logging
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from zoo_checks.middleware import QueryStats
+from zoo_checks.models import Enclosure, User
+
+
+def test_query_count_middleware(client, user_base, caplog):
+    client.force_login(user_base)
+
+    with caplog.at_level(logging.INFO, logger="zootable"):
+        resp = client.get(reverse("home"))
+
+    assert resp.status_code == 200
+    assert resp["Server-Timing"].startswith("db;dur=")
+    assert "queries" in resp["Server-Timing"]
+
+    (record,) = [r for r in caplog.records if r.name.endswith("middleware")]
+    assert record.levelno == logging.INFO
+    message = record.getMessage()
+    assert "path=/ view=home status=200" in message
+    # session, user, roles, enclosures...
+    num_queries = int(message.split("queries=")[1].split()[0])
+    assert num_queries > 0
+
+
+def test_query_count_middleware_threshold(client, user_base, caplog, settings):
+    settings.QUERY_COUNT_THRESHOLDS = {"home": 1}
+    client.force_login(user_base)
+
+    with caplog.at_level(logging.INFO, logger="zootable"):
+        client.get(reverse("home"))
+
+    (record,) = [r for r in caplog.records if r.name.endswith("middleware")]
+    assert record.levelno == logging.WARNING
+    assert "threshold=1" in record.getMessage()
+
+
+def test_query_count_middleware_streaming(
+    client, user_base, enclosure_base, animal_count_A_BAR, caplog
+):
+    client.force_login(user_base)
+    today = dt.date.today()
+
+    with caplog.at_level(logging.INFO, logger="zootable"):
+        resp = client.post(
+            reverse("export"),
+            {
+                "start_date": (today - dt.timedelta(days=1)).strftime("%m/%d/%Y"),
+                "end_date": today.strftime("%m/%d/%Y"),
+                "selected_enclosures": enclosure_base.id,
+                "export_format": "csv",
+            },
+        )
+        # the csv is read from the database as it is sent, logged after
+        assert not [r for r in caplog.records if r.name.endswith("middleware")]
+        with CaptureQueriesContext(connection) as ctx:
+            content = b"".join(resp.streaming_content)
+
+    assert animal_count_A_BAR.animal.accession_number.encode() in content
+    assert "Server-Timing" not in resp
+    assert ctx.captured_queries
+
+    (record,) = [r for r in caplog.records if r.name.endswith("middleware")]
+    message = record.getMessage()
+    assert "view=export status=200" in message
+    # the request's queries, and those of the content
+    num_queries = int(message.split("queries=")[1].split()[0])
+    assert num_queries > len(ctx.captured_queries)
+
+
+def test_query_stats(db):
+    stats = QueryStats()
+    with connection.execute_wrapper(stats):
+        for _ in range(3):
+            list(Enclosure.objects.all())
+        User.objects.count()
+
+    assert stats.num_queries == 4
+    # the enclosure query repeated twice
+    assert stats.duplicates == 2
+    assert stats.db_time > 0
@@ -1,8 +1,19 @@
 """test models"""
 
 import pytest
-from django.utils.timezone import localtime
-from zoo_checks.models import Animal, AnimalCount, Enclosure, Group, GroupCount, Species
+from django.core.cache import cache
+from django.utils.timezone import localtime, timedelta
+
+from zoo_checks.helpers import today_time
+from zoo_checks.models import (
+    Animal,
+    AnimalCount,
+    DailyEnclosureSummary,
+    Enclosure,
+    Group,
+    GroupCount,
+    Species,
+)
 
 
 def test_animal_instance(animal_A):
@@ -106,3 +117,149 @@ def test_enclosure_all_counts(create_many_counts, user_base, django_assert_num_q
 
     assert all(c.user == user_base for c in group_counts)
     assert all(c.count_total == 6 for c in group_counts)
+
+
+def test_enclosure_prior_history(
+    enclosure_base,
+    animal_A,
+    group_B,
+    species_base,
+    animal_count_factory,
+    group_count_factory,
+    species_count_factory,
+    user_factory,
+    django_assert_num_queries,
+):
+    yesterday = today_time() - timedelta(hours=12)
+    two_days_ago = yesterday - timedelta(days=1)
+
+    # counts by different users on the same day, latest wins
+    animal_count_factory(
+        "SE", yesterday - timedelta(minutes=1), user=user_factory("other")
+    )
+    animal_count = animal_count_factory("BA", yesterday)
+    group_count = group_count_factory(6, 4, 2, 1, datetimecounted=two_days_ago)
+    species_count_factory(7, datetimecounted=yesterday)
+
+    with django_assert_num_queries(3):
+        history = enclosure_base.prior_history(
+            [species_base], [group_B], [animal_A], prior_days=3
+        )
+
+    animal_history = history["animals"][animal_A.id]
+    assert [h["count"] for h in animal_history] == [animal_count, None, None]
+
+    group_history = history["groups"][group_B.id]
+    assert [h["count"] for h in group_history] == [None, group_count, None]
+
+    species_history = history["species"][species_base.id]
+    assert [h["count"] for h in species_history] == [7, 0, 0]
+
+    # matches the per object methods
+    assert animal_history == animal_A.prior_conditions()
+    assert group_history == group_B.prior_counts()
+    assert species_history == species_base.prior_counts(enclosure_base)
+
+
+def test_update_or_create_from_form(
+    enclosure_base, animal_A, user_base, django_assert_num_queries
+):
+    def _count(condition, comment=""):
+        return AnimalCount(
+            condition=condition,
+            comment=comment,
+            animal=animal_A,
+            user=user_base,
+            enclosure=enclosure_base,
+        )
+
+    # the upsert, and the 5 queries refreshing the enclosure summary
+    with django_assert_num_queries(6):
+        _count("SE").update_or_create_from_form()
+
+    # same user, day, animal, enclosure updates the count
+    with django_assert_num_queries(6):
+        _count("BA", "feeling good").update_or_create_from_form()
+
+    count = AnimalCount.objects.get(animal=animal_A)
+    assert count.condition == "BA"
+    assert count.comment == "feeling good"
+
+    # duplicates in a batch, last one wins
+    AnimalCount.bulk_update_or_create_from_form([_count("NA"), _count("SE")])
+    assert AnimalCount.objects.get(animal=animal_A).condition == "SE"
+
+
+def test_daily_enclosure_summary(create_many_counts, django_assert_num_queries):
+    """the summaries match the tallies the home page used to compute"""
+    _, _, _, enc_list = create_many_counts(num_enc=3, num_anim=2, num_species=2)
+    today = today_time().date()
+
+    with django_assert_num_queries(5):
+        summaries = DailyEnclosureSummary.refresh([e.id for e in enc_list], today)
+
+    for enc in enc_list:
+        summary = summaries[enc.id]
+        assert summary.total_animals == 2
+        assert summary.observed_animals == 2
+        assert summary.animals_bar == 2
+        assert summary.animal_conditions()["BAR"] == 2
+        assert (summary.num_groups, summary.total_groups) == (2, 60)
+        # group counts are seen=1, bar=3 each
+        assert summary.group_counts() == {"Seen": 2, "BAR": 6, "Needs Attn": 0}
+        assert summary.group_count_total == 8
+
+    # cached
+    with django_assert_num_queries(0):
+        cached = DailyEnclosureSummary.for_enclosures(enc_list)
+    assert cached.keys() == summaries.keys()
+
+    # stored, one query for all of them
+    cache.clear()
+    with django_assert_num_queries(1):
+        stored = DailyEnclosureSummary.for_enclosures(enc_list)
+    assert stored.keys() == summaries.keys()
+
+
+def test_daily_enclosure_summary_invalidation(
+    enclosure_base,
+    enclosure_factory,
+    animal_A,
+    animal_count_factory,
+    django_capture_on_commit_callbacks,
+):
+    today = today_time().date()
+    summary = DailyEnclosureSummary.for_enclosures([enclosure_base])[enclosure_base.id]
+    assert (summary.total_animals, summary.observed_animals) == (1, 0)
+
+    # saving a count outside a form deletes the summary once committed, recomputed
+    # when needed
+    with django_capture_on_commit_callbacks(execute=True):
+        animal_count_factory("SE")
+        assert DailyEnclosureSummary.objects.filter(date=today).exists()
+    assert not DailyEnclosureSummary.objects.filter(date=today).exists()
+    summary = DailyEnclosureSummary.for_enclosures([enclosure_base])[enclosure_base.id]
+    assert summary.animals_seen == 1
+
+    # as does changing the animals
+    with django_capture_on_commit_callbacks(execute=True):
+        animal_A.active = False
+        animal_A.save()
+    summary = DailyEnclosureSummary.for_enclosures([enclosure_base])[enclosure_base.id]
+    assert (summary.total_animals, summary.observed_animals) == (0, 0)
+
+    # moving an animal refreshes the enclosures it moved between, not the others
+    other, unrelated = enclosure_factory("other"), enclosure_factory("unrelated")
+    DailyEnclosureSummary.for_enclosures([enclosure_base, other, unrelated])
+    with django_capture_on_commit_callbacks(execute=True):
+        animal_A.active = True
+        animal_A.enclosure = other
+        animal_A.save()
+    assert set(
+        DailyEnclosureSummary.objects.filter(date=today).values_list(
+            "enclosure", flat=True
+        )
+    ) == {unrelated.id}
+    summaries = DailyEnclosureSummary.for_enclosures([enclosure_base, other])
+    assert summaries[enclosure_base.id].total_animals == 0
+    assert summaries[other.id].total_animals == 1
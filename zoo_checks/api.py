@@ -0,0 +1,349 @@
+"""Read-only JSON API of enclosures, animals, groups, species and their counts
+
+For other tools, instead of scraping the history pages. Users see the enclosures
+of their roles, like on the site. Lists are keyset paginated (see pagination.py):
+`next` is the url of the next page, None on the last one, and `limit` sets the
+page size. Responses have an ETag, a request with a matching If-None-Match gets
+an empty 304.
+
+The history endpoints downsample the counts for charts: the latest count of each
+day, week or month in a date range (see charts.history_series). The conditions
+endpoints count the animal counts of each condition, optionally in a window of
+recent days (see charts.condition_distribution).
+"""
+
+import datetime
+from functools import wraps
+
+from django.db.models import Q
+from django.http import Http404, HttpRequest, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import conditional_page, require_safe
+
+from .cache import get_accessible_enclosure_ids
+from .charts import (
+    CONDITION_WINDOWS,
+    condition_distribution,
+    history_range,
+    history_series,
+)
+from .models import (
+    Animal,
+    AnimalCount,
+    Enclosure,
+    Group,
+    GroupCount,
+    Species,
+    SpeciesCount,
+)
+from .pagination import InvalidCursor, KeysetPaginator
+from .views import get_accessible_enclosures
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view):
+    """GET only, JSON errors, private responses with an ETag of their content"""
+
+    @require_safe
+    @conditional_page
+    @wraps(view)
+    def wrapper(request: HttpRequest, *args, **kwargs):
+        if not request.user.is_authenticated:
+            response = JsonResponse({"error": "Authentication required"}, status=401)
+        else:
+            try:
+                response = view(request, *args, **kwargs)
+            except ApiError as e:
+                response = JsonResponse({"error": str(e)}, status=e.status)
+            except Http404 as e:
+                response = JsonResponse({"error": str(e)}, status=404)
+        # per user, revalidated with the ETag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return wrapper
+
+
+def check_permitted(request: HttpRequest, enclosure_id):
+    user = request.user
+    if not user.is_superuser and enclosure_id not in get_accessible_enclosure_ids(user):
+        raise ApiError("You do not have permissions to access this enclosure", 403)
+
+
+def get_limit(request: HttpRequest) -> int:
+    try:
+        limit = int(request.GET.get("limit", API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError("limit must be an integer")
+    if not 1 <= limit <= API_MAX_PAGE_SIZE:
+        raise ApiError(f"limit must be between 1 and {API_MAX_PAGE_SIZE}")
+    return limit
+
+
+def paginated_response(request: HttpRequest, queryset, serialize, ordering):
+    """a page of the serialized objects and the url of the next page"""
+    paginator = KeysetPaginator(queryset, ordering, per_page=get_limit(request))
+    try:
+        page = paginator.page(after=request.GET.get("cursor"))
+    except InvalidCursor as e:
+        raise ApiError(str(e))
+
+    next_url = None
+    if page.has_next():
+        query = request.GET.copy()
+        query["cursor"] = page.next_cursor
+        next_url = f"{request.path}?{query.urlencode()}"
+
+    return JsonResponse({"results": [serialize(obj) for obj in page], "next": next_url})
+
+
+def get_date(request: HttpRequest, param):
+    value = request.GET.get(param)
+    if value is None:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ApiError(f"{param} must be a date (YYYY-MM-DD)")
+
+
+def history_response(request: HttpRequest, counts_query):
+    """the latest count of each ?bucket=day|week|month between ?start= and ?end="""
+    bucket = request.GET.get("bucket", "day")
+    try:
+        start_date, end_date = history_range(
+            bucket, get_date(request, "start"), get_date(request, "end")
+        )
+    except ValueError as e:
+        raise ApiError(str(e))
+    return JsonResponse(history_series(counts_query, bucket, start_date, end_date))
+
+
+def conditions_response(request: HttpRequest, counts_query):
+    """number of counts of each condition, in the last ?days= (30, 90 or 365)"""
+    days = request.GET.get("days")
+    if days is not None:
+        if days not in {str(d) for d in CONDITION_WINDOWS}:
+            raise ApiError(
+                f"days must be one of {', '.join(map(str, CONDITION_WINDOWS))}"
+            )
+        days = int(days)
+    distribution = condition_distribution(counts_query, days)
+    labels = dict(AnimalCount.CONDITIONS)
+    return JsonResponse(
+        {
+            "days": days,
+            "conditions": [
+                {"condition": cond, "label": labels[cond], "count": num}
+                for cond, num in distribution.items()
+            ],
+        }
+    )
+
+
+def enclosure_filter(request: HttpRequest) -> dict:
+    """animals/groups in the accessible enclosures, or in ?enclosure=<slug>"""
+    slug = request.GET.get("enclosure")
+    if slug is not None:
+        enclosure = get_object_or_404(Enclosure, slug=slug)
+        check_permitted(request, enclosure.id)
+        return {"enclosure": enclosure}
+    return {"enclosure__in": get_accessible_enclosures(request.user)}
+
+
+""" serializers """
+
+
+def enclosure_to_json(enclosure) -> dict:
+    return {"id": enclosure.id, "name": enclosure.name, "slug": enclosure.slug}
+
+
+def species_to_json(species) -> dict:
+    return {
+        "id": species.id,
+        "slug": species.slug,
+        "common_name": species.common_name,
+        "class_name": species.class_name,
+        "order_name": species.order_name,
+        "family_name": species.family_name,
+        "genus_name": species.genus_name,
+        "species_name": species.species_name,
+    }
+
+
+def animal_to_json(animal) -> dict:
+    return {
+        "accession_number": animal.accession_number,
+        "name": animal.name,
+        "identifier": animal.identifier,
+        "sex": animal.sex,
+        "active": animal.active,
+        "species": animal.species.slug,
+        "enclosure": animal.enclosure.slug if animal.enclosure else None,
+        "counts": reverse("api_animal_counts", args=[animal.accession_number]),
+    }
+
+
+def group_to_json(group) -> dict:
+    return {
+        "accession_number": group.accession_number,
+        "active": group.active,
+        "population_male": group.population_male,
+        "population_female": group.population_female,
+        "population_unknown": group.population_unknown,
+        "population_total": group.population_total,
+        "species": group.species.slug,
+        "enclosure": group.enclosure.slug if group.enclosure else None,
+        "counts": reverse("api_group_counts", args=[group.accession_number]),
+    }
+
+
+def count_to_json(count) -> dict:
+    """the fields all counts have"""
+    return {
+        "id": count.id,
+        "datetimecounted": count.datetimecounted,
+        "datecounted": count.datecounted,
+        "user": count.user.username if count.user else None,
+    }
+
+
+def animal_count_to_json(count) -> dict:
+    return {
+        **count_to_json(count),
+        "condition": count.condition,
+        "comment": count.comment,
+    }
+
+
+def group_count_to_json(count) -> dict:
+    return {
+        **count_to_json(count),
+        "count_total": count.count_total,
+        "count_seen": count.count_seen,
+        "count_not_seen": count.count_not_seen,
+        "count_bar": count.count_bar,
+        "needs_attn": count.needs_attn,
+        "comment": count.comment,
+    }
+
+
+def species_count_to_json(count) -> dict:
+    return {**count_to_json(count), "count": count.count}
+
+
+""" views """
+
+
+@api_view
+def enclosures(request: HttpRequest):
+    return paginated_response(
+        request, get_accessible_enclosures(request.user), enclosure_to_json, ("id",)
+    )
+
+
+@api_view
+def animals(request: HttpRequest):
+    queryset = Animal.objects.filter(**enclosure_filter(request)).select_related(
+        "species", "enclosure"
+    )
+    return paginated_response(request, queryset, animal_to_json, ("id",))
+
+
+@api_view
+def groups(request: HttpRequest):
+    queryset = Group.objects.filter(**enclosure_filter(request)).select_related(
+        "species", "enclosure"
+    )
+    return paginated_response(request, queryset, group_to_json, ("id",))
+
+
+@api_view
+def species(request: HttpRequest):
+    """the species of the animals and groups in the accessible enclosures"""
+    in_enclosures = enclosure_filter(request)
+    queryset = Species.objects.filter(
+        Q(id__in=Animal.objects.filter(**in_enclosures).values("species_id"))
+        | Q(id__in=Group.objects.filter(**in_enclosures).values("species_id"))
+    )
+    return paginated_response(request, queryset, species_to_json, ("id",))
+
+
+# newest first, like the history pages (the counts' latest indexes)
+COUNTS_ORDERING = ("-datetimecounted", "-id")
+
+
+@api_view
+def animal_counts(request: HttpRequest, animal):
+    animal = get_object_or_404(Animal, accession_number=animal)
+    check_permitted(request, animal.enclosure_id)
+    queryset = AnimalCount.objects.filter(animal=animal).select_related("user")
+    return paginated_response(request, queryset, animal_count_to_json, COUNTS_ORDERING)
+
+
+@api_view
+def group_counts(request: HttpRequest, group):
+    group = get_object_or_404(Group, accession_number=group)
+    check_permitted(request, group.enclosure_id)
+    queryset = GroupCount.objects.filter(group=group).select_related("user")
+    return paginated_response(request, queryset, group_count_to_json, COUNTS_ORDERING)
+
+
+@api_view
+def species_counts(request: HttpRequest, species_slug, enclosure_slug):
+    species = get_object_or_404(Species, slug=species_slug)
+    enclosure = get_object_or_404(Enclosure, slug=enclosure_slug)
+    check_permitted(request, enclosure.id)
+    queryset = SpeciesCount.objects.filter(
+        species=species, enclosure=enclosure
+    ).select_related("user")
+    return paginated_response(request, queryset, species_count_to_json, COUNTS_ORDERING)
+
+
+@api_view
+def animal_history(request: HttpRequest, animal):
+    animal = get_object_or_404(Animal, accession_number=animal)
+    check_permitted(request, animal.enclosure_id)
+    return history_response(request, AnimalCount.objects.filter(animal=animal))
+
+
+@api_view
+def group_history(request: HttpRequest, group):
+    group = get_object_or_404(Group, accession_number=group)
+    check_permitted(request, group.enclosure_id)
+    return history_response(request, GroupCount.objects.filter(group=group))
+
+
+@api_view
+def species_history(request: HttpRequest, species_slug, enclosure_slug):
+    species = get_object_or_404(Species, slug=species_slug)
+    enclosure = get_object_or_404(Enclosure, slug=enclosure_slug)
+    check_permitted(request, enclosure.id)
+    return history_response(
+        request, SpeciesCount.objects.filter(species=species, enclosure=enclosure)
+    )
+
+
+@api_view
+def animal_conditions(request: HttpRequest, animal):
+    animal = get_object_or_404(Animal, accession_number=animal)
+    check_permitted(request, animal.enclosure_id)
+    return conditions_response(request, AnimalCount.objects.filter(animal=animal))
+
+
+@api_view
+def enclosure_conditions(request: HttpRequest, enclosure_slug):
+    """the conditions of all the animal counts in the enclosure"""
+    enclosure = get_object_or_404(Enclosure, slug=enclosure_slug)
+    check_permitted(request, enclosure.id)
+    return conditions_response(request, AnimalCount.objects.filter(enclosure=enclosure))
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ZooChecksConfig(AppConfig):
     name = "zoo_checks"
+
+    def ready(self):
+        from . import signals  # noqa: F401
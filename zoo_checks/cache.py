@@ -0,0 +1,200 @@
+"""Caching of expensive read-only data
+
+Keys are `<namespace>:<version>:<parts>`. Each namespace has a version stored in
+the cache, invalidating a whole namespace bumps its version so the old values are
+never read again (and expire on their own). Single values are deleted directly.
+
+The backend is configured with `CACHES` in the settings. It has to be shared by
+every process: the version bumps and deletes of one process (a web worker, the job
+worker, the zoo_cache command) are only seen by the others through it.
+
+A request reads each namespace version from the cache once, the value reads after
+the first cost one cache query instead of two.
+"""
+
+import time
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.dispatch import receiver
+
+# seconds
+TIMEOUTS = {
+    # species/animals/groups of an enclosure, changed by ingest and the admin
+    "roster": 60 * 60,
+    # DailyEnclosureSummary rows for the home page
+    "summary": 60 * 60,
+    # history page charts, until the next count of the object
+    "chart": 60 * 60,
+    # roles and accessible enclosures of a user, until roles change
+    "permissions": 15 * 60,
+}
+
+NAMESPACES = tuple(TIMEOUTS)
+
+# namespace: version, read during the current request (None outside of requests)
+request_versions = ContextVar("request_versions", default=None)
+
+
+@receiver(request_started)
+def start_request_versions(**kwargs):
+    request_versions.set({})
+
+
+@receiver(request_finished)
+def end_request_versions(**kwargs):
+    request_versions.set(None)
+
+
+def version_key(namespace) -> str:
+    return f"{namespace}:version"
+
+
+def get_version(namespace) -> int:
+    versions = request_versions.get()
+    if versions is not None and namespace in versions:
+        return versions[namespace]
+
+    version = cache.get(version_key(namespace))
+    if version is None:
+        # another process may set it first
+        cache.add(version_key(namespace), time.time_ns(), None)
+        version = cache.get(version_key(namespace))
+    if versions is not None:
+        versions[namespace] = version
+    return version
+
+
+def invalidate(namespace):
+    """invalidates every value in the namespace"""
+    # a new unique version, even if the old one was evicted
+    version = time.time_ns()
+    cache.set(version_key(namespace), version, None)
+    versions = request_versions.get()
+    if versions is not None:
+        versions[namespace] = version
+
+
+def make_key(namespace, *parts) -> str:
+    return ":".join(str(p) for p in (namespace, get_version(namespace), *parts))
+
+
+def get_or_set(namespace, parts, default):
+    """cached value of default() under the key from namespace and parts"""
+    return cache.get_or_set(make_key(namespace, *parts), default, TIMEOUTS[namespace])
+
+
+def clear():
+    """invalidates every namespace"""
+    for namespace in NAMESPACES:
+        invalidate(namespace)
+
+
+""" rosters """
+
+
+def roster_version() -> int:
+    return get_version("roster")
+
+
+def invalidate_rosters():
+    """called when species, animals, groups, enclosures or roles' enclosures change"""
+    invalidate("roster")
+
+
+def get_roster(enclosure) -> dict:
+    """Cached Enclosure.roster(): the enclosure's species, animals and groups"""
+    return get_or_set("roster", [enclosure.id], enclosure.roster)
+
+
+def get_visible_enclosure_ids(role, default) -> list:
+    """Cached ids of the home page enclosures of the role (all if None), or default()
+
+    cached until the active animals/groups or the role's enclosures change. They are
+    not filtered by the user's permissions, see get_accessible_enclosure_ids.
+    """
+    return get_or_set("roster", ["visible", role.id if role else "all"], default)
+
+
+""" enclosure summaries """
+
+
+def summary_key(enclosure_id, date) -> str:
+    return make_key("summary", date.isoformat(), enclosure_id)
+
+
+def get_summaries(enclosure_ids, date) -> dict:
+    """enclosure id: cached DailyEnclosureSummary, for those that are cached"""
+    keys = {summary_key(enc_id, date): enc_id for enc_id in enclosure_ids}
+    return {keys[key]: summary for key, summary in cache.get_many(keys).items()}
+
+
+def set_summaries(summaries):
+    cache.set_many(
+        {summary_key(s.enclosure_id, s.date): s for s in summaries},
+        TIMEOUTS["summary"],
+    )
+
+
+def delete_summary(enclosure_id, date):
+    cache.delete(summary_key(enclosure_id, date))
+
+
+""" history charts """
+
+
+def chart_key(object_field, object_id, enclosure_id=None) -> str:
+    """species charts are per enclosure, animal/group charts per object"""
+    if object_field == "species":
+        return make_key("chart", object_field, object_id, enclosure_id)
+    return make_key("chart", object_field, object_id)
+
+
+def get_chart_data(object_field, object_id, default, enclosure_id=None) -> dict:
+    return cache.get_or_set(
+        chart_key(object_field, object_id, enclosure_id), default, TIMEOUTS["chart"]
+    )
+
+
+def delete_chart_data(counts):
+    """deletes the charts of the objects of saved counts"""
+    cache.delete_many(
+        {
+            chart_key(
+                c.object_field, getattr(c, f"{c.object_field}_id"), c.enclosure_id
+            )
+            for c in counts
+        }
+    )
+
+
+""" permissions """
+
+
+def get_user_roles(user) -> list:
+    """the user's roles, cached until any role changes"""
+    return get_or_set("permissions", ["roles", user.id], lambda: list(user.roles.all()))
+
+
+def get_accessible_enclosure_ids(user) -> frozenset:
+    """ids of the enclosures in the user's roles (superusers can access all)
+
+    memoized on the user for the rest of the request and cached until roles change
+    """
+    ids = getattr(user, "_accessible_enclosure_ids", None)
+    if ids is None:
+        ids = get_or_set(
+            "permissions",
+            ["enclosures", user.id],
+            lambda: frozenset(
+                user.roles.values_list("enclosures", flat=True).exclude(enclosures=None)
+            ),
+        )
+        user._accessible_enclosure_ids = ids
+    return ids
+
+
+def invalidate_permissions():
+    """called when roles, or their users or enclosures, change"""
+    invalidate("permissions")
@@ -0,0 +1,165 @@
+"""Chart data of the history pages
+
+Each chart is built from one query of the object's counts, newest first (the
+counts' latest indexes), and is cached until the next count of the object (see
+get_chart_data and delete_chart_data in cache.py).
+
+history_series downsamples longer ranges for the line charts: the latest count of
+each day, week or month, in one DISTINCT ON query.
+"""
+
+from collections import Counter
+
+from django.db.models import Count, DateField
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import AnimalCount, GroupCount, SpeciesCount
+
+# counts in the line and pie charts
+CHART_LENGTH = 100
+
+# days of the condition distribution windows (all counts without one)
+CONDITION_WINDOWS = (30, 90, 365)
+
+
+def histogram(values) -> tuple[list, list]:
+    """the sorted distinct values and the number of times each occurs"""
+    counts = Counter(values)
+    labels = sorted(counts)
+    return labels, [counts[label] for label in labels]
+
+
+def condition_distribution(counts_query, days=None) -> dict:
+    """number of animal counts of each condition, in one query
+
+    in the order of AnimalCount.CONDITIONS, with the conditions without counts.
+    only counts of the last `days` days (including today) if given
+    """
+    if days is not None:
+        counts_query = counts_query.filter(
+            datecounted__gt=timezone.localdate() - timezone.timedelta(days=days)
+        )
+    # db counts each condition type
+    query_data = (
+        counts_query.values("condition")
+        .order_by("condition")
+        .annotate(num=Count("condition"))
+    )
+    cond_nums = {count["condition"]: count["num"] for count in query_data}
+    return {
+        cond_slug: cond_nums.get(cond_slug, 0)
+        for cond_slug, _ in AnimalCount.CONDITIONS
+    }
+
+
+def animal_chart_data(counts_query) -> dict:
+    """number of counts of each condition, for the history page pie chart"""
+    chart_data = list(condition_distribution(counts_query).values())
+    # gets the full name of the condition (from second item in tuple)
+    chart_labels = [c[1] for c in AnimalCount.CONDITIONS]
+
+    return {"chart_data": chart_data, "chart_labels": chart_labels}
+
+
+def group_chart_data(counts_query) -> dict:
+    """line charts of the last 100 counts and a pie chart of their seen counts"""
+    rows = list(
+        counts_query.values("datecounted", "count_total", "count_seen", "count_bar")[
+            :CHART_LENGTH
+        ]
+    )
+    chart_data_line_seen = [r["count_seen"] for r in rows]
+    chart_labels_pie, chart_data_pie = histogram(chart_data_line_seen)
+
+    return {
+        "chart_data_line_total": [r["count_total"] for r in rows],
+        "chart_data_line_seen": chart_data_line_seen,
+        "chart_data_line_bar": [r["count_bar"] for r in rows],
+        "chart_labels_line": [r["datecounted"].strftime("%m-%d-%Y") for r in rows],
+        "chart_data_pie": chart_data_pie,
+        "chart_labels_pie": chart_labels_pie,
+    }
+
+
+def species_chart_data(counts_query) -> dict:
+    """line chart of the last 100 counts, oldest first, and a pie chart of them"""
+    rows = list(counts_query.values("datecounted", "count")[:CHART_LENGTH])
+    rows.reverse()
+    chart_data_line_total = [r["count"] for r in rows]
+    chart_labels_pie, chart_data_pie = histogram(chart_data_line_total)
+
+    return {
+        "chart_data_line_total": chart_data_line_total,
+        "chart_labels_line": [r["datecounted"].strftime("%m-%d-%Y") for r in rows],
+        "chart_data_pie": chart_data_pie,
+        "chart_labels_pie": chart_labels_pie,
+    }
+
+
+# bucket: range when no start date is given, in days
+HISTORY_BUCKETS = {
+    "day": 100,
+    "week": 2 * 365,
+    "month": 10 * 365,
+}
+# days in a bucket, at least
+BUCKET_DAYS = {"day": 1, "week": 7, "month": 28}
+# bounds the size of a series
+MAX_HISTORY_BUCKETS = 1000
+
+# count model: the fields of its series
+HISTORY_FIELDS = {
+    AnimalCount: ["condition"],
+    GroupCount: ["count_total", "count_seen", "count_bar"],
+    SpeciesCount: ["count"],
+}
+
+
+def history_range(bucket, start_date=None, end_date=None) -> tuple:
+    """the date range of a series, raises ValueError for too many buckets
+
+    ends today and starts HISTORY_BUCKETS[bucket] days before the end by default
+    """
+    if bucket not in HISTORY_BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(HISTORY_BUCKETS)}")
+    if end_date is None:
+        end_date = timezone.localdate()
+    if start_date is None:
+        start_date = end_date - timezone.timedelta(days=HISTORY_BUCKETS[bucket])
+    if start_date > end_date:
+        raise ValueError("start must be before end")
+    if (end_date - start_date).days // BUCKET_DAYS[bucket] >= MAX_HISTORY_BUCKETS:
+        raise ValueError(f"more than {MAX_HISTORY_BUCKETS} buckets, use a larger one")
+    return start_date, end_date
+
+
+def history_series(counts_query, bucket, start_date, end_date) -> dict:
+    """the latest count of each day/week/month in the date range, in one query
+
+    labels are the first day of each bucket with counts, the model's
+    HISTORY_FIELDS are series of the same length
+    """
+    fields = HISTORY_FIELDS[counts_query.model]
+    rows = (
+        counts_query.filter(datecounted__gte=start_date, datecounted__lte=end_date)
+        .annotate(bucket=Trunc("datecounted", bucket, output_field=DateField()))
+        .order_by("bucket", "-datetimecounted", "-id")
+        .distinct("bucket")
+        .values("bucket", *fields)
+    )
+
+    series = {field: [] for field in fields}
+    labels = []
+    for row in rows:
+        labels.append(row["bucket"].isoformat())
+        for field in fields:
+            series[field].append(row[field])
+
+    return {
+        "bucket": bucket,
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "labels": labels,
+        **series,
+    }
@@ -0,0 +1,355 @@
+"""Export of counts to excel/csv/parquet/arrow, for the export view and export jobs
+
+The export is one UNION ALL query of the first animal, group and species counts of
+each day, in the columns and order of the export. get_export_df reads it into a
+dataframe, iter_export_rows streams it a chunk at a time for the writers.
+"""
+
+import csv
+import datetime
+import importlib.util
+import zlib
+from itertools import islice
+
+import openpyxl
+import pandas as pd
+from django.conf import settings
+from django.db import models
+from django.db.models import F, Func, Value
+from django.db.models.functions import Cast, Collate
+
+from .models import AnimalCount, GroupCount, SpeciesCount
+
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_CONTENT_TYPE = "text/csv"
+
+# parquet/arrow need pyarrow (`uv pip install -e .[arrow]`)
+ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+# format: label, file extension and content type
+EXPORT_FORMATS = {
+    "xlsx": {"label": "Excel", "ext": "xlsx", "content_type": XLSX_CONTENT_TYPE},
+    "csv": {"label": "CSV", "ext": "csv", "content_type": CSV_CONTENT_TYPE},
+    "csv.gz": {
+        "label": "CSV (gzip)",
+        "ext": "csv.gz",
+        "content_type": "application/gzip",
+    },
+    "parquet": {
+        "label": "Parquet",
+        "ext": "parquet",
+        "content_type": "application/vnd.apache.parquet",
+    },
+    # the stream format, its dictionaries can change between record batches
+    "arrow": {
+        "label": "Arrow IPC",
+        "ext": "arrows",
+        "content_type": "application/vnd.apache.arrow.stream",
+    },
+}
+if not ARROW_AVAILABLE:
+    del EXPORT_FORMATS["parquet"], EXPORT_FORMATS["arrow"]
+
+# streamed by the export view, the others are written by an export job
+STREAMED_FORMATS = ("csv", "csv.gz")
+
+# rows read from the database at a time
+EXPORT_CHUNK_SIZE = 2000
+
+# the columns of the export, in order
+EXPORT_COLUMNS = [
+    "enclosure",
+    "date_counted",
+    "time_counted",
+    "class_name",
+    "order_name",
+    "family_name",
+    "genus_name",
+    "species_name",
+    "common_name",
+    "user",
+    "condition",
+    "comment",
+    "count_total",
+    "count_seen",
+    "count_not_seen",
+    "count_bar",
+    "needs_attn",
+    "count",
+    "accession_number",
+]
+SPECIES_COLUMNS = EXPORT_COLUMNS[3:9]
+
+# aliases of the columns in the query, the names can't be the models' field names
+EXPORT_ALIASES = {col: f"export_{col}" for col in EXPORT_COLUMNS}
+
+# the rows are sorted by enclosure, date_counted, time_counted, species_name
+EXPORT_ORDERING = [
+    EXPORT_ALIASES[col]
+    for col in ("enclosure", "date_counted", "time_counted", "species_name")
+]
+
+# count model: export column: lookup, besides the common ones
+COUNT_LOOKUPS = {
+    AnimalCount: {
+        "condition": "condition",
+        "comment": "comment",
+        "accession_number": "animal__accession_number",
+    },
+    GroupCount: {
+        "comment": "comment",
+        "count_total": "count_total",
+        "count_seen": "count_seen",
+        "count_not_seen": "count_not_seen",
+        "count_bar": "count_bar",
+        "needs_attn": "needs_attn",
+        "accession_number": "group__accession_number",
+    },
+    SpeciesCount: {"count": "count"},
+}
+
+# the type of the columns that not all count models have, their NULLs are cast
+# so the UNION can match the types
+MISSING_COLUMNS = {
+    "condition": models.CharField(),
+    "comment": models.TextField(),
+    "count_total": models.IntegerField(),
+    "count_seen": models.IntegerField(),
+    "count_not_seen": models.IntegerField(),
+    "count_bar": models.IntegerField(),
+    "needs_attn": models.BooleanField(),
+    "count": models.IntegerField(),
+}
+
+
+def get_export_querysets(enclosures, start_date, end_date) -> list:
+    """the first count of each animal/group/species on each day in the date range"""
+    # TODO: abstract to a function that returns this for any model?
+    animal_counts = (
+        AnimalCount.objects.filter(
+            enclosure__in=enclosures,
+            datecounted__gte=start_date,
+            datecounted__lte=end_date,
+        )
+        .order_by("datecounted", "animal_id", "datetimecounted")
+        .distinct("datecounted", "animal_id")
+    )
+    group_counts = (
+        GroupCount.objects.filter(
+            enclosure__in=enclosures,
+            datecounted__gte=start_date,
+            datecounted__lte=end_date,
+        )
+        .order_by("datecounted", "group_id", "datetimecounted")
+        .distinct("datecounted", "group_id")
+    )
+    species_counts = (
+        SpeciesCount.objects.filter(
+            enclosure__in=enclosures,
+            datecounted__gte=start_date,
+            datecounted__lte=end_date,
+        )
+        .order_by("datecounted", "species_id", "datetimecounted")
+        .distinct("datecounted", "species_id")
+    )
+    return [animal_counts, group_counts, species_counts]
+
+
+def local_time(field):
+    """HH:MM:SS of a datetime in the app's timezone, as text"""
+    return Func(
+        Func(Value(settings.TIME_ZONE), F(field), function="timezone"),
+        Value("HH24:MI:SS"),
+        function="to_char",
+        output_field=models.CharField(),
+    )
+
+
+def export_values(qs):
+    """a queryset from get_export_querysets, in the export columns
+
+    species fields are the counted object's species, columns the model doesn't
+    have are NULL (an empty accession number for species counts)
+    """
+    model = qs.model
+    species = "species" if model is SpeciesCount else f"{model.object_field}__species"
+    lookups = COUNT_LOOKUPS[model]
+
+    columns = {
+        # "C" collation sorts like python strings (and like pandas did)
+        "enclosure": Collate("enclosure__name", "C"),
+        "date_counted": F("datecounted"),
+        "time_counted": local_time("datetimecounted"),
+        **{col: F(f"{species}__{col}") for col in SPECIES_COLUMNS},
+        "species_name": Collate(f"{species}__species_name", "C"),
+        "user": F("user__username"),
+        **{
+            col: F(lookups[col]) if col in lookups else Cast(Value(None), output_field)
+            for col, output_field in MISSING_COLUMNS.items()
+        },
+        "accession_number": F(lookups["accession_number"])
+        if "accession_number" in lookups
+        else Value("", output_field=models.CharField()),
+    }
+    return qs.values(**{EXPORT_ALIASES[col]: columns[col] for col in EXPORT_COLUMNS})
+
+
+def get_export_query(enclosures, start_date, end_date):
+    """the export rows as dicts of EXPORT_ALIASES, sorted, in one query"""
+    animal_counts, group_counts, species_counts = (
+        export_values(qs)
+        for qs in get_export_querysets(enclosures, start_date, end_date)
+    )
+    return animal_counts.union(group_counts, species_counts, all=True).order_by(
+        *EXPORT_ORDERING
+    )
+
+
+def iter_export_rows(enclosures, start_date, end_date, chunk_size=EXPORT_CHUNK_SIZE):
+    """the export rows as lists in EXPORT_COLUMNS order, a chunk at a time
+
+    memory doesn't grow with the date range
+    """
+    aliases = list(EXPORT_ALIASES.values())
+    query = get_export_query(enclosures, start_date, end_date)
+    for row in query.iterator(chunk_size):
+        yield [row[alias] for alias in aliases]
+
+
+def get_export_df(enclosures, start_date, end_date) -> pd.DataFrame:
+    """the export as a dataframe, empty if there are no counts in the range"""
+    return pd.DataFrame(
+        iter_export_rows(enclosures, start_date, end_date), columns=EXPORT_COLUMNS
+    )
+
+
+def export_filename(enclosures, start_date, end_date, ext="xlsx") -> str:
+    enclosure_names = "_".join(enc.slug for enc in enclosures)
+    start_date_str = start_date.strftime("%Y%m%d")
+    end_date_str = end_date.strftime("%Y%m%d")
+    return f"zootable_export_{enclosure_names}_{start_date_str}_{end_date_str}.{ext}"
+
+
+class Echo:
+    """An object that implements just the write method of the file-like interface"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    """the csv lines of the rows, with a header, for a StreamingHttpResponse"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_csv_gzip(rows):
+    """stream_csv, gzip compressed"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for line in stream_csv(rows):
+        chunk = compressor.compress(line.encode())
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+def write_xlsx(rows, file) -> int:
+    """writes the rows to an excel file with a write only workbook
+
+    returns the number of rows written
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    sheet.append(EXPORT_COLUMNS)
+    num_rows = 0
+    for row in rows:
+        sheet.append(row)
+        num_rows += 1
+    workbook.save(file)
+    return num_rows
+
+
+def arrow_schema():
+    """typed export columns: dates, small int counts and categorical names"""
+    import pyarrow as pa
+
+    categorical = pa.dictionary(pa.int32(), pa.string())
+    types = {
+        "enclosure": categorical,
+        "date_counted": pa.date32(),
+        "time_counted": pa.time32("s"),
+        **{col: categorical for col in SPECIES_COLUMNS},
+        "user": categorical,
+        "condition": categorical,
+        "comment": pa.string(),
+        "count_total": pa.int16(),
+        "count_seen": pa.int16(),
+        "count_not_seen": pa.int16(),
+        "count_bar": pa.int16(),
+        "needs_attn": pa.bool_(),
+        "count": pa.int16(),
+        "accession_number": pa.string(),
+    }
+    return pa.schema([(col, types[col]) for col in EXPORT_COLUMNS])
+
+
+def iter_record_batches(rows, schema, chunk_size=EXPORT_CHUNK_SIZE):
+    """the rows as arrow record batches of chunk_size rows"""
+    import pyarrow as pa
+
+    time_index = EXPORT_COLUMNS.index("time_counted")
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        columns = list(zip(*chunk))
+        columns[time_index] = [
+            datetime.time.fromisoformat(t) for t in columns[time_index]
+        ]
+        yield pa.record_batch(
+            [
+                pa.array(values, type=field.type)
+                for values, field in zip(columns, schema)
+            ],
+            schema=schema,
+        )
+
+
+def write_parquet(rows, file) -> int:
+    """writes the rows to a parquet file a record batch at a time
+
+    returns the number of rows written
+    """
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema()
+    num_rows = 0
+    with pq.ParquetWriter(file, schema) as writer:
+        for batch in iter_record_batches(rows, schema):
+            writer.write_batch(batch)
+            num_rows += batch.num_rows
+    return num_rows
+
+
+def write_arrow(rows, file) -> int:
+    """writes the rows to an arrow IPC stream a record batch at a time
+
+    returns the number of rows written
+    """
+    import pyarrow as pa
+
+    schema = arrow_schema()
+    num_rows = 0
+    with pa.ipc.new_stream(file, schema) as writer:
+        for batch in iter_record_batches(rows, schema):
+            writer.write_batch(batch)
+            num_rows += batch.num_rows
+    return num_rows
+
+
+# the writers of the formats written to a file by export jobs
+EXPORT_WRITERS = {
+    "xlsx": write_xlsx,
+    "parquet": write_parquet,
+    "arrow": write_arrow,
+}
@@ -3,17 +3,67 @@ import datetime
 from django import forms
 from django.utils import timezone
 
-from .models import AnimalCount, Enclosure, GroupCount, SpeciesCount
+from .export import EXPORT_FORMATS
+from .models import (
+    Animal,
+    AnimalCount,
+    Enclosure,
+    Group,
+    GroupCount,
+    Species,
+    SpeciesCount,
+)
+
+
+class RosterChoiceField(forms.ModelChoiceField):
+    """a hidden object of the enclosure's roster
+
+    looked up in `objects` ({id: object}) when set, instead of a query
+    """
+
+    widget = forms.HiddenInput
+    objects = None
+
+    def to_python(self, value):
+        if self.objects is None:
+            return super().to_python(value)
+        if value in self.empty_values:
+            return None
+        try:
+            return self.objects[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+
+
+class RosterCountForm(forms.ModelForm):
+    """a count form of the objects of an enclosure's roster
+
+    roster is {field name: {id: object}} of the objects a form can be for, loaded
+    once for the formset. Those fields are validated against it, without a query
+    each for the field and for the model validation of the foreign key.
+    """
+
+    def __init__(self, *args, roster=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.roster = roster or {}
+        for name, objects in self.roster.items():
+            self.fields[name].objects = objects
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        exclude.update(self.roster)
+        return exclude
 
 
-class AnimalCountForm(forms.ModelForm):
+class AnimalCountForm(RosterCountForm):
     class Meta:
         model = AnimalCount
         fields = ["condition", "comment", "animal", "enclosure"]
 
-        # hide animal form element
-        widgets = {"animal": forms.HiddenInput(), "enclosure": forms.HiddenInput()}
-
     condition = forms.ChoiceField(
         choices=AnimalCount.CONDITIONS,
         widget=forms.RadioSelect,
@@ -21,16 +71,15 @@ class AnimalCountForm(forms.ModelForm):
         required=False,
         show_hidden_initial=True,
     )
+    animal = RosterChoiceField(queryset=Animal.objects.all())
+    enclosure = RosterChoiceField(queryset=Enclosure.objects.all())
 
 
-class SpeciesCountForm(forms.ModelForm):
+class SpeciesCountForm(RosterCountForm):
     class Meta:
         model = SpeciesCount
         fields = ["count", "species", "enclosure"]
 
-        # hide species/enclosure form elements
-        widgets = {"species": forms.HiddenInput(), "enclosure": forms.HiddenInput()}
-
     count = forms.IntegerField(
         max_value=None,
         min_value=0,
@@ -39,9 +88,11 @@ class SpeciesCountForm(forms.ModelForm):
             attrs={"style": "width: 3ch", "class": "narrow-count"}
         ),
     )
+    species = RosterChoiceField(queryset=Species.objects.all())
+    enclosure = RosterChoiceField(queryset=Enclosure.objects.all())
 
 
-class GroupCountForm(forms.ModelForm):
+class GroupCountForm(RosterCountForm):
     class Meta:
         model = GroupCount
         fields = [
@@ -55,12 +106,7 @@ class GroupCountForm(forms.ModelForm):
         ]
 
         # TODO: figure out how to add max value in widget attrs
-        widgets = {
-            # hide species/enclosure form elements
-            "group": forms.HiddenInput(),
-            "enclosure": forms.HiddenInput(),
-            "count_total": forms.HiddenInput(),
-        }
+        widgets = {"count_total": forms.HiddenInput()}
 
     count_seen = forms.IntegerField(
         max_value=None,
@@ -78,6 +124,8 @@ class GroupCountForm(forms.ModelForm):
             attrs={"style": "width: 3ch", "class": "narrow-count count_bar_input"}
         ),
     )
+    group = RosterChoiceField(queryset=Group.objects.all())
+    enclosure = RosterChoiceField(queryset=Enclosure.objects.all())
 
     def clean(self):
         cleaned_data = super().clean()
@@ -104,6 +152,15 @@ class ExportForm(forms.Form):
     )
     start_date = forms.DateField(required=True)
     end_date = forms.DateField(required=True)
+    export_format = forms.ChoiceField(
+        choices=[(key, fmt["label"]) for key, fmt in EXPORT_FORMATS.items()],
+        widget=forms.RadioSelect,
+        required=False,
+    )
+
+    def clean_export_format(self):
+        # excel by default
+        return self.cleaned_data["export_format"] or "xlsx"
 
     def clean(self):
         cleaned_data = super().clean()
@@ -3,10 +3,15 @@ from __future__ import annotations
 from itertools import compress
 from operator import itemgetter
 
+import numpy as np
 import pandas as pd
-from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
 
-from zoo_checks.models import Animal, Enclosure, Group, Species
+from zoo_checks.cache import invalidate_rosters
+from zoo_checks.helpers import today_time
+from zoo_checks.models import Animal, DailyEnclosureSummary, Enclosure, Group, Species
 
 TRACKS_REQ_COLS = [
     "Enclosure",
@@ -64,87 +69,177 @@ def get_enclosures(df: pd.DataFrame) -> set[str]:
     return set(df["Enclosure"])
 
 
-def create_enclosures(df: pd.DataFrame):
+def create_enclosures(df: pd.DataFrame) -> dict[str, Enclosure]:
     """Given data in a pandas dataframe, create any missing enclosures"""
-    enclosures = get_enclosures(df)
-    for enclosure in enclosures:
-        create_enclosure_name(enclosure)
+    return create_enclosure_names(get_enclosures(df))
 
 
-def create_enclosure_name(enclosure_name: str) -> Enclosure:
-    encl, _ = Enclosure.objects.get_or_create(name=enclosure_name)
-    return encl
+def create_enclosure_names(enclosure_names) -> dict[str, Enclosure]:
+    """Creates any missing enclosures
 
+    Returns a dict of enclosure name: Enclosure
+    """
+    enclosures = Enclosure.objects.in_bulk(list(enclosure_names), field_name="name")
+    Enclosure.objects.bulk_create(
+        Enclosure(name=name) for name in enclosure_names if name not in enclosures
+    )
+    return Enclosure.objects.in_bulk(list(enclosure_names), field_name="name")
+
+
+# species field: spreadsheet column
+SPECIES_COLS = {
+    "genus_name": "GSS",
+    "species_name": "Species",
+    "class_name": "Class",
+    "order_name": "Order",
+    "family_name": "Family",
+}
+
+
+def create_species(df: pd.DataFrame) -> dict[str, Species]:
+    """Create any species that exist in the pandas dataframe but not in the database
+
+    Existing species (by common name) are updated from the dataframe
+
+    Returns a dict of common name: Species
+    """
+    if len(df.index) == 0:
+        return {}
+
+    # common names are unique, the last row wins
+    df_species = df.drop_duplicates(subset=["Common"], keep="last")
+    species = Species.objects.in_bulk(
+        list(df_species["Common"]), field_name="common_name"
+    )
 
-def create_species(df: pd.DataFrame):
-    """Create any species that exist in the pandas dataframe but not in the database"""
-    df_species = df.drop_duplicates(
-        subset=["Common", "GSS", "Species", "Class", "Order", "Family"]
+    new_species, changed_species = [], []
+    for row in df_species.to_dict("records"):
+        attributes = {field: row[col] for field, col in SPECIES_COLS.items()}
+        sp = species.get(row["Common"])
+        if sp is None:
+            new_species.append(Species(common_name=row["Common"], **attributes))
+        elif any(getattr(sp, f) != value for f, value in attributes.items()):
+            for field, value in attributes.items():
+                setattr(sp, field, value)
+            changed_species.append(sp)
+
+    Species.objects.bulk_create(new_species)
+    Species.objects.bulk_update(changed_species, list(SPECIES_COLS))
+
+    species.update({sp.common_name: sp for sp in new_species})
+    return species
+
+
+def get_sexes(df: pd.DataFrame) -> pd.Series:
+    """sex column, or M/F from a population of 1, unknown (U) otherwise"""
+    from_population = np.where(
+        df["Population _Female"] == 1,
+        "F",
+        np.where(df["Population _Male"] == 1, "M", "U"),
     )
-    for _, row in df_species.iterrows():
-        common_name = row["Common"]
-        genus_name = row["GSS"]
-        species_name = row["Species"]
-        class_name = row["Class"]
-        order_name = row["Order"]
-        family_name = row["Family"]
-        Species.objects.update_or_create(
-            common_name=common_name,
-            defaults={
-                "genus_name": genus_name,
-                "species_name": species_name,
-                "class_name": class_name,
-                "order_name": order_name,
-                "family_name": family_name,
-            },
+    return df["Sex"].where(df["Sex"].notna(), from_population)
+
+
+def get_related_ids(df: pd.DataFrame, col, objs: dict, model) -> pd.Series:
+    """ids of the objects named in a column, raises DoesNotExist if any are missing"""
+    ids = df[col].map({key: obj.id for key, obj in objs.items()})
+    missing = df.loc[ids.isna(), col]
+    if len(missing.index) > 0:
+        raise model.DoesNotExist(
+            f"{model._meta.verbose_name} not found: {', '.join(map(str, missing))}"
         )
+    return ids.astype(int)
 
 
-def get_sex(row):
-    # start with sex being unknown
-    sex = "U"
-    # use sex column as primary
-    if not pd.isna(row["Sex"]):
-        # sets sex to either M/F/U
-        sex = row["Sex"]
-    # use population values as secondary if available
-    else:
-        if row["Population _Male"] == 1:
-            sex = "M"
-        if row["Population _Female"] == 1:
-            sex = "F"
-    return sex
-
-
-def get_group_attributes(row):
-    active, accession_number, species, enclosure = get_animal_set_info(row)
-    population_male = row["Population _Male"]
-    population_female = row["Population _Female"]
-    population_unknown = row["Population _Unknown"]
-
-    # todo: we need to make sure we grab _all_ the attributes
-    # something like Model._meta.get_fields()
-
-    attributes = {
-        "accession_number": accession_number,
-        "active": active,
-        "enclosure": enclosure,
-        "species": species,
-        "population_male": population_male,
-        "population_female": population_female,
-        "population_unknown": population_unknown,
-        "population_total": population_male + population_female + population_unknown,
-    }
+def get_animal_set_frame(df: pd.DataFrame, species=None, enclosures=None):
+    """attributes common to all animal_sets, as columns
+
+    species/enclosures are dicts of common name/name to objects, loaded if missing
+    """
+    if species is None:
+        species = Species.objects.in_bulk(
+            list(set(df["Common"])), field_name="common_name"
+        )
+    if enclosures is None:
+        enclosures = Enclosure.objects.in_bulk(
+            list(get_enclosures(df)), field_name="name"
+        )
+
+    accession_numbers = df["Accession"].astype(str)
+    return pd.DataFrame(
+        {
+            "accession_number": accession_numbers,
+            "active": True,
+            "enclosure_id": get_related_ids(df, "Enclosure", enclosures, Enclosure),
+            "species_id": get_related_ids(df, "Common", species, Species),
+            # the same as the AutoSlugField, without a query for each object
+            "slug": accession_numbers.map(slugify),
+        },
+        index=df.index,
+    )
+
+
+def get_group_frame(df: pd.DataFrame, species=None, enclosures=None):
+    """group attributes of every row, as columns"""
+    frame = get_animal_set_frame(df, species, enclosures)
+    frame["population_male"] = df["Population _Male"]
+    frame["population_female"] = df["Population _Female"]
+    frame["population_unknown"] = df["Population _Unknown"]
+    frame["population_total"] = (
+        df["Population _Male"] + df["Population _Female"] + df["Population _Unknown"]
+    )
+    return frame
+
+
+def get_animal_frame(df: pd.DataFrame, species=None, enclosures=None):
+    """animal attributes of every row, as columns"""
+    frame = get_animal_set_frame(df, species, enclosures)
+    frame["name"] = df["Internal  House  Name"].fillna("")
+    frame["identifier"] = df["Tag /Band"].fillna("")
+    frame["sex"] = get_sexes(df)
+    return frame
+
+
+def update_or_create_animal_sets(model, frame: pd.DataFrame) -> list:
+    """Creates or updates the animals/groups in a frame of their attributes
+
+    The same as update_or_create by accession number for every row, in 3 queries
+
+    Returns the created and updated objects
+    """
+    # * This overrides anything in the database for this accession number
+    frame = frame.drop_duplicates(subset=["accession_number"], keep="last")
+    existing = model.objects.in_bulk(
+        list(frame["accession_number"]), field_name="accession_number"
+    )
+    is_new = ~frame["accession_number"].isin(existing.keys())
+
+    new_objs = [model(**row) for row in frame[is_new].to_dict("records")]
+
+    # slugs of existing objects don't change
+    update_fields = [c for c in frame.columns if c not in ("accession_number", "slug")]
+    updated_objs = []
+    for row in frame[~is_new].to_dict("records"):
+        obj = existing[row["accession_number"]]
+        for field in update_fields:
+            setattr(obj, field, row[field])
+        updated_objs.append(obj)
+
+    model.objects.bulk_create(new_objs)
+    model.objects.bulk_update(updated_objs, update_fields)
 
-    return attributes
+    return updated_objs + new_objs
 
 
-def create_groups(df: pd.DataFrame):
-    """Creates groups"""
+def create_groups(df: pd.DataFrame, species=None, enclosures=None) -> list[Group]:
+    """Creates groups
+
+    species/enclosures are dicts of common name/name to objects, loaded if missing
+    """
 
     # we sometimes don't have any to add
     if len(df.index) == 0:
-        return None
+        return []
 
     pop_sum = df[["Population _Male", "Population _Female", "Population _Unknown"]].sum(
         axis=1
@@ -157,45 +252,14 @@ def create_groups(df: pd.DataFrame):
     # col names for groups:
     # active, accession_number, species, population_male, population_female,
     # population_unknown, enclosure, population_total
-    for _, row in df.iterrows():
-        attributes = get_group_attributes(row)
-
-        # * This overrides anything in the database for this accession number
-        Group.objects.update_or_create(
-            accession_number=attributes.pop("accession_number"), defaults=attributes
-        )
-
+    return update_or_create_animal_sets(Group, get_group_frame(df, species, enclosures))
 
-def get_animal_attributes(row):
-    # zootable animal col names:
-    # name, active, accession, species, Tag /Band, Internal  House  Name, enclosure, sex
 
-    # todo: we need to always make sure we grab _all_ the attributes
+def create_animals(df: pd.DataFrame, species=None, enclosures=None) -> list[Animal]:
+    """Creates animals (individuals)
 
-    active, accession_number, species, enclosure = get_animal_set_info(row)
-    name = (
-        row["Internal  House  Name"]
-        if not pd.isna(row["Internal  House  Name"])
-        else ""
-    )
-    identifier = row["Tag /Band"] if not pd.isna(row["Tag /Band"]) else ""
-    sex = get_sex(row)
-
-    attributes = {
-        "accession_number": accession_number,
-        "name": name,
-        "identifier": identifier,
-        "active": active,
-        "sex": sex,
-        "enclosure": enclosure,
-        "species": species,
-    }
-
-    return attributes
-
-
-def create_animals(df: pd.DataFrame) -> list[Animal]:
-    """Creates animals (individuals)"""
+    species/enclosures are dicts of common name/name to objects, loaded if missing
+    """
 
     # we sometimes don't have any to add
     if len(df.index) == 0:
@@ -209,42 +273,16 @@ def create_animals(df: pd.DataFrame) -> list[Animal]:
     except AssertionError:
         raise ValueError("Cannot create individuals. Not all have a pop. of 1")
 
-    created_animals = []
-    for _, row in df.iterrows():
-        attributes = get_animal_attributes(row)
-
-        # * This overrides anything in the database for this accession number
-        animal, _ = Animal.objects.update_or_create(
-            accession_number=attributes.pop("accession_number"), defaults=attributes
-        )
-        created_animals.append(animal)
-    return created_animals
-
-
-def change_obj_active_state(model, accession_number, active_state):
-    """Marks an animal/group active/inactive"""
-    obj = model.objects.get(accession_number=accession_number)
-    obj.active = active_state
-    obj.save()
-
-
-def get_species_obj(row):
-    # common names are unique
-    return Species.objects.get(common_name=row["Common"])
-
-
-def get_enclosure_obj(row):
-    """Returns an Enclosure object from database given its name"""
-    return Enclosure.objects.get(name=row["Enclosure"])
+    return update_or_create_animal_sets(
+        Animal, get_animal_frame(df, species, enclosures)
+    )
 
 
-def get_animal_set_info(row):
-    """returns data common to all animal_sets"""
-    active = True
-    accession_number = row["Accession"]
-    species = get_species_obj(row)
-    enclosure = get_enclosure_obj(row)
-    return active, accession_number, species, enclosure
+def change_active_state(model, accession_numbers, active_state):
+    """Marks animals/groups active/inactive"""
+    model.objects.filter(accession_number__in=accession_numbers).update(
+        active=active_state
+    )
 
 
 def find_animals_groups(df):
@@ -258,6 +296,10 @@ def find_animals_groups(df):
     return animals, groups
 
 
+# changeset actions that create/update an animal or group
+WRITE_ACTIONS = ("add", "switch", "update")
+
+
 def create_changeset_action(action, **kwargs):
     changeset = {"action": action}
     changeset.update(kwargs)
@@ -274,9 +316,11 @@ def get_objs_to_delete(df, modeltype, enclosure_names):
 
     # "active" animals/groups in included enclosures that aren't in uploaded accession
     # nums need to be deleted
-    objs_to_delete = modeltype.objects.filter(
-        active=True, enclosure__in=enclosure_objects
-    ).exclude(accession_number__in=upload_accession_numbers)
+    objs_to_delete = (
+        modeltype.objects.filter(active=True, enclosure__in=enclosure_objects)
+        .exclude(accession_number__in=upload_accession_numbers)
+        .select_related("species", "enclosure")
+    )
 
     for obj in objs_to_delete:
         obj_attrs = obj.to_dict()
@@ -292,40 +336,147 @@ def get_objs_to_delete(df, modeltype, enclosure_names):
     return changesets
 
 
+# changeset field: lookup of its current value
+ANIMAL_SET_STATE = {
+    "active": "active",
+    "enclosure": "enclosure__name",
+    "species": "species__common_name",
+    **{field: f"species__{field}" for field in SPECIES_COLS},
+}
+STATE_FIELDS = {
+    Animal: {
+        **ANIMAL_SET_STATE,
+        "name": "name",
+        "identifier": "identifier",
+        "sex": "sex",
+    },
+    Group: {
+        **ANIMAL_SET_STATE,
+        "population_male": "population_male",
+        "population_female": "population_female",
+        "population_unknown": "population_unknown",
+    },
+}
+
+
+def get_current_state(modeltype, accession_numbers) -> pd.DataFrame:
+    """the fields compared by get_modeltype_changeset, in one query
+
+    indexed by accession number
+    """
+    lookups = STATE_FIELDS[modeltype]
+    rows = modeltype.objects.filter(
+        accession_number__in=list(accession_numbers)
+    ).values_list("accession_number", *lookups.values())
+    return pd.DataFrame.from_records(
+        rows, columns=["accession_number", *lookups]
+    ).set_index("accession_number")
+
+
+def get_upload_state(df, modeltype) -> pd.DataFrame:
+    """the uploaded values of the fields in get_current_state
+
+    indexed by accession number
+    """
+    state = pd.DataFrame(
+        {
+            "active": True,
+            "enclosure": df["Enclosure"],
+            "species": df["Common"],
+            **{field: df[col] for field, col in SPECIES_COLS.items()},
+        },
+        index=df.index,
+    )
+    if modeltype is Animal:
+        state["name"] = df["Internal  House  Name"].fillna("")
+        state["identifier"] = df["Tag /Band"].fillna("")
+        state["sex"] = get_sexes(df)
+    else:
+        state["population_male"] = df["Population _Male"]
+        state["population_female"] = df["Population _Female"]
+        state["population_unknown"] = df["Population _Unknown"]
+    state.index = df["Accession"].astype(str).rename("accession_number")
+    return state[list(STATE_FIELDS[modeltype])]
+
+
 def get_modeltype_changeset(df, modeltype):
     """Generic way to get list of changesets
-    Iterate over every object
-    For each object, determine if any of its attributes changed
-    Record changes as a changeset for that object
+
+    Compares the uploaded rows with the current state of that modeltype:
+    - add: a new accession number
+    - switch: an accession number of the other modeltype (animal <-> group)
+    - update: some fields changed, with their before/after values
+    - unchanged: nothing to write
     """
+    # * the last row for an accession number overrides the others
+    df = df.drop_duplicates(subset=["Accession"], keep="last")
+
+    other_modeltype = Group if modeltype is Animal else Animal
+    upload = get_upload_state(df, modeltype)
+    current = get_current_state(modeltype, upload.index).reindex(upload.index)
+    # active is never null for existing objects
+    exists = current["active"].notna().to_numpy()
+    other_exists = upload.index.isin(
+        list(
+            other_modeltype.objects.filter(
+                accession_number__in=list(upload.index)
+            ).values_list("accession_number", flat=True)
+        )
+    )
 
-    add_update_changesets = []
+    # column by column, missing values on both sides are equal
+    changed = upload.ne(current) & ~(upload.isna() & current.isna())
+    actions = np.select(
+        [~exists & other_exists, ~exists, changed.any(axis=1).to_numpy()],
+        ["switch", "add", "update"],
+        "unchanged",
+    )
 
-    for _, row in df.iterrows():
-        try:
-            # if this doesn't fail, an entry exists for that modeltype
-            modeltype.objects.get(accession_number=row["Accession"])
+    # before/after of the changed fields, as native python types for the session
+    is_update = actions == "update"
+    changes = iter(
+        {
+            field: {"before": before[field], "after": after[field]}
+            for field, is_changed in fields.items()
+            if is_changed
+        }
+        for before, after, fields in zip(
+            current[is_update].to_dict("records"),
+            upload[is_update].to_dict("records"),
+            changed[is_update].to_dict("records"),
+        )
+    )
 
-            # * this is not necessarily an update if there's been no change
-            # TODO: separate type added if nothing changed
-            add_update_changesets.append(
+    changesets = []
+    for action, row in zip(actions, df.to_dict("records")):
+        if action == "unchanged":
+            # only what the confirmation page shows
+            changesets.append(
                 create_changeset_action(
-                    "update", object_kwargs=row.to_dict(), enclosure=row["Enclosure"]
+                    action,
+                    object_kwargs={"Accession": row["Accession"]},
+                    enclosure=row["Enclosure"],
                 )
             )
-        except ObjectDoesNotExist:
-            # an addition for this modeltype
-            add_update_changesets.append(
+        elif action == "update":
+            changesets.append(
                 create_changeset_action(
-                    "add", object_kwargs=row.to_dict(), enclosure=row["Enclosure"]
+                    action,
+                    object_kwargs=row,
+                    enclosure=row["Enclosure"],
+                    changes=next(changes),
+                )
+            )
+        else:
+            changesets.append(
+                create_changeset_action(
+                    action, object_kwargs=row, enclosure=row["Enclosure"]
                 )
             )
 
-            # todo: check to see if it's a deletion of the other model type here?
-
-    add_update_changesets.sort(key=itemgetter("enclosure"))
+    changesets.sort(key=itemgetter("enclosure"))
 
-    return add_update_changesets
+    return changesets
 
 
 def get_changesets(df):
@@ -372,49 +523,84 @@ def handle_upload(f):
     return changeset
 
 
+@transaction.atomic
 def ingest_changesets(changesets):
+    """Saves the changesets with bulk inserts/updates, all or nothing
+
+    bulk writes don't send signals, caches are invalidated here once the
+    changesets are committed
+    """
     # create new enclosures
-    for enc_name in changesets.get("enclosures"):
-        create_enclosure_name(enc_name)
+    enclosures = create_enclosure_names(changesets.get("enclosures"))
 
-    # create new species
+    # create new species, unchanged animals/groups are not written
     anim_add_dict = [
         value["object_kwargs"]
         for value in changesets.get("animals")
-        if value["action"] in ("add", "update")
+        if value["action"] in WRITE_ACTIONS
     ]
     grp_add_dict = [
         value["object_kwargs"]
         for value in changesets.get("groups")
-        if value["action"] in ("add", "update")
+        if value["action"] in WRITE_ACTIONS
     ]
 
     add_dict = anim_add_dict + grp_add_dict
     add_df = pd.DataFrame(add_dict)
-    create_species(add_df)
+    species = create_species(add_df)
+
+    # animals/groups may be in enclosures that were not uploaded
+    if len(add_df.index) > 0:
+        enclosures.update(create_enclosures(add_df))
 
     # create new animals
     anim_add_df = pd.DataFrame(anim_add_dict)
-    create_animals(anim_add_df)
+    create_animals(anim_add_df, species, enclosures)
 
     # create new groups
     grp_add_df = pd.DataFrame(grp_add_dict)
-    create_groups(grp_add_df)
+    create_groups(grp_add_df, species, enclosures)
 
-    # make inactive animals
+    # make inactive animals, and those that became groups
     inactive_animals = [
-        value["object_kwargs"]
+        value["object_kwargs"]["accession_number"]
         for value in changesets.get("animals")
         if value["action"] == "del"
+    ] + [
+        value["object_kwargs"]["Accession"]
+        for value in changesets.get("groups")
+        if value["action"] == "switch"
     ]
-    for obj in inactive_animals:
-        change_obj_active_state(Animal, obj["accession_number"], False)
+    change_active_state(Animal, inactive_animals, False)
 
-    # make inactive groups
+    # make inactive groups, and those that became animals
     inactive_groups = [
-        value["object_kwargs"]
+        value["object_kwargs"]["accession_number"]
         for value in changesets.get("groups")
         if value["action"] == "del"
+    ] + [
+        value["object_kwargs"]["Accession"]
+        for value in changesets.get("animals")
+        if value["action"] == "switch"
     ]
-    for obj in inactive_groups:
-        change_obj_active_state(Group, obj["accession_number"], False)
+    change_active_state(Group, inactive_groups, False)
+
+    transaction.on_commit(invalidate_rosters)
+    transaction.on_commit(lambda: refresh_summaries(changesets))
+
+
+def refresh_summaries(changesets):
+    """Refreshes today's enclosure summaries after populations changed
+
+    enclosures in the changesets, and any that already have a summary today
+    (animals/groups may have moved out of them)
+    """
+    today = today_time().date()
+    enclosure_names = set(changesets.get("enclosures")) | {
+        value["enclosure"]
+        for value in changesets.get("animals") + changesets.get("groups")
+    }
+    enclosure_ids = Enclosure.objects.filter(
+        Q(name__in=enclosure_names) | Q(daily_summaries__date=today)
+    ).values_list("id", flat=True)
+    DailyEnclosureSummary.refresh(enclosure_ids, today)
@@ -0,0 +1,110 @@
+"""Background jobs: ingests and exports run by the run_jobs command, not in requests
+
+Jobs are rows of the Job table, the workers poll it (no broker needed).
+A runner gets the job, reports its progress with job.set_progress and returns
+the keyword arguments of job.succeed. Anything it raises fails the job.
+"""
+
+import datetime
+import logging
+import tempfile
+from collections import Counter
+
+from django.core.files import File
+
+from .export import EXPORT_FORMATS, EXPORT_WRITERS, export_filename, iter_export_rows
+from .ingest import ingest_changesets
+from .models import Enclosure, Job, StagedUpload
+
+baselogger = logging.getLogger("zootable")
+LOGGER = baselogger.getChild(__name__)
+
+# job kind: runner
+RUNNERS = {}
+
+
+def runner(kind):
+    def decorator(func):
+        RUNNERS[kind] = func
+        return func
+
+    return decorator
+
+
+def ingest_report(changesets, upload_file) -> dict:
+    """the number of each action for animals and groups"""
+    return {
+        "upload_file": upload_file,
+        "enclosures": len(changesets["enclosures"]),
+        "animals": dict(Counter(c["action"] for c in changesets["animals"])),
+        "groups": dict(Counter(c["action"] for c in changesets["groups"])),
+    }
+
+
+@runner("ingest")
+def run_ingest(job) -> dict:
+    """params: staged_upload (token)"""
+    job.set_progress(0, 2, "Loading the upload")
+    staged = StagedUpload.get_active(job.params["staged_upload"])
+    if staged is None:
+        raise ValueError("The upload expired, please upload the file again")
+    changesets = staged.changesets
+
+    # progress inside the ingest transaction would not be seen until it commits
+    job.set_progress(1, message="Saving the changes")
+    ingest_changesets(changesets)
+    staged.delete()
+
+    return {"result": ingest_report(changesets, staged.upload_file)}
+
+
+@runner("export")
+def run_export(job) -> dict:
+    """params: enclosure_ids, start_date, end_date (iso format), export_format"""
+    export_format = job.params.get("export_format", "xlsx")
+    write = EXPORT_WRITERS[export_format]
+    enclosures = Enclosure.objects.filter(id__in=job.params["enclosure_ids"])
+    start_date = datetime.date.fromisoformat(job.params["start_date"])
+    end_date = datetime.date.fromisoformat(job.params["end_date"])
+
+    filename = export_filename(
+        enclosures, start_date, end_date, EXPORT_FORMATS[export_format]["ext"]
+    )
+
+    # streamed from the database into a temporary file, copied to the storage
+    job.set_progress(0, 1, "Writing the file")
+    with tempfile.TemporaryFile() as output:
+        num_rows = write(iter_export_rows(enclosures, start_date, end_date), output)
+        if num_rows == 0:
+            raise ValueError("No data in range")
+        job.result_file.save(filename, File(output), save=False)
+
+    return {"result": {"rows": num_rows}, "result_filename": filename}
+
+
+def run_job(job):
+    """runs a claimed job, saving its result or error"""
+    try:
+        outcome = RUNNERS[job.kind](job)
+    except Exception as e:
+        LOGGER.exception("job failed", extra={"job": str(job.token)})
+        job.fail(e)
+    else:
+        job.succeed(**outcome)
+    return job
+
+
+def run_next_job():
+    """claims and runs the oldest queued job, returns it (None if none are queued)"""
+    job = Job.claim_next()
+    if job is not None:
+        run_job(job)
+    return job
+
+
+def run_pending() -> int:
+    """runs queued jobs until there are none, returns the number run"""
+    num_run = 0
+    while run_next_job() is not None:
+        num_run += 1
+    return num_run
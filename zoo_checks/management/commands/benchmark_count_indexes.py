@@ -0,0 +1,156 @@
+"""Compares the count query plans/timings with and without the composite indexes
+
+Creates a synthetic zoo, runs EXPLAIN ANALYZE on the "latest count per object per
+day" queries with the indexes, then drops the indexes and runs them again.
+Everything happens in a transaction that is rolled back.
+
+Takes exclusive locks on the count tables while running, use a dev database.
+"""
+
+import re
+import statistics
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from zoo_checks.helpers import today_time
+from zoo_checks.models import AnimalCount, Enclosure, GroupCount, SpeciesCount
+from zoo_checks.synthetic import create_zoo
+
+COUNT_MODELS = (AnimalCount, GroupCount, SpeciesCount)
+
+EXECUTION_TIME_RE = re.compile(r"Execution Time: ([\d.]+) ms")
+
+
+def get_queries(zoo) -> dict:
+    """the count access paths used throughout the app, by name"""
+    enclosure = zoo["enclosures"][0]
+    animals = [a for a in zoo["animals"] if a.enclosure_id == enclosure.id]
+    groups = [g for g in zoo["groups"] if g.enclosure_id == enclosure.id]
+    species = enclosure.species()
+    animal = animals[0]
+
+    today = today_time()
+    # somewhere in the middle of the history
+    day = today - timezone.timedelta(days=180)
+    next_day = day + timezone.timedelta(days=1)
+
+    return {
+        "animal count_on_day": (
+            animal.conditions.filter(
+                datetimecounted__gte=day, datetimecounted__lt=next_day
+            ).order_by("-datetimecounted", "-id")[:1]
+        ),
+        "animal history page": (
+            AnimalCount.objects.filter(animal=animal).order_by(
+                "-datetimecounted", "-id"
+            )[100:110]
+        ),
+        "animal conditions": (
+            AnimalCount.objects.filter(animal=animal)
+            .values("condition")
+            .order_by("condition")
+            .annotate(num=Count("condition"))
+        ),
+        "animal prior counts": AnimalCount.latest_per_day_query(
+            "animal", animals, 3, today
+        ),
+        "group prior counts": GroupCount.latest_per_day_query(
+            "group", groups, 3, today
+        ),
+        "species prior counts": SpeciesCount.latest_per_day_query(
+            "species", species, 3, today, enclosure=enclosure
+        ),
+        "animal counts_on_day": AnimalCount.counts_on_day(animals, day),
+        "enclosure animal counts": Enclosure.all_counts(zoo["enclosures"], day)[0],
+        "enclosure group counts": Enclosure.all_counts(zoo["enclosures"], day)[1],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares count query plans and timings with/without the composite count "
+        "indexes on a synthetic multi-year dataset (rolled back afterwards)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--years", type=int, default=3)
+        parser.add_argument("--enclosures", type=int, default=5)
+        parser.add_argument("--species", type=int, default=20)
+        parser.add_argument(
+            "--animals", type=int, default=20, help="animals per enclosure"
+        )
+        parser.add_argument(
+            "--groups", type=int, default=5, help="groups per enclosure"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="runs per query, median is reported"
+        )
+        parser.add_argument(
+            "--plans", action="store_true", help="print the query plans"
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write("Creating synthetic zoo...")
+            zoo = create_zoo(
+                num_enclosures=options["enclosures"],
+                num_species=options["species"],
+                num_animals=options["animals"],
+                num_groups=options["groups"],
+                years=options["years"],
+                prefix="benchmark",
+            )
+            for name, num in zoo["num_counts"].items():
+                self.stdout.write(f"  {num} {name}")
+
+            queries = get_queries(zoo)
+
+            self.analyze()
+            after = self.run_queries(queries, options["repeat"])
+
+            self.drop_indexes()
+            self.analyze()
+            before = self.run_queries(queries, options["repeat"])
+
+            self.report(before, after, options["plans"])
+
+            transaction.set_rollback(True)
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            for model in COUNT_MODELS:
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+    def drop_indexes(self):
+        with connection.schema_editor() as schema_editor:
+            for model in COUNT_MODELS:
+                for index in model._meta.indexes:
+                    schema_editor.remove_index(model, index)
+
+    def run_queries(self, queries, repeat) -> dict:
+        """name: (median execution time in ms, query plan)"""
+        results = {}
+        for name, qs in queries.items():
+            times = []
+            for _ in range(repeat):
+                plan = qs.explain(analyze=True)
+                times.append(float(EXECUTION_TIME_RE.search(plan).group(1)))
+            results[name] = (statistics.median(times), plan)
+        return results
+
+    def report(self, before, after, plans):
+        self.stdout.write(
+            f"\n{'query':<28}{'before (ms)':>14}{'after (ms)':>14}{'speedup':>10}"
+        )
+        for name, (before_time, before_plan) in before.items():
+            after_time, after_plan = after[name]
+            speedup = before_time / after_time if after_time else float("inf")
+            self.stdout.write(
+                f"{name:<28}{before_time:>14.3f}{after_time:>14.3f}{speedup:>9.1f}x"
+            )
+            if plans:
+                self.stdout.write(f"\n-- before\n{before_plan}")
+                self.stdout.write(f"\n-- after\n{after_plan}\n")
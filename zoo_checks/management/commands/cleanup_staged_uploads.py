@@ -0,0 +1,15 @@
+"""Deletes the staged uploads that were never confirmed (see StagedUpload)"""
+
+from django.core.management.base import BaseCommand
+
+from zoo_checks.models import StagedUpload
+
+
+class Command(BaseCommand):
+    help = "deletes expired staged uploads, run periodically (e.g. from cron)"
+
+    def handle(self, *args, **options):
+        num_deleted = StagedUpload.cleanup()
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {num_deleted} expired staged uploads")
+        )
@@ -0,0 +1,54 @@
+"""Generates a synthetic zoo for local development and load testing"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from zoo_checks.synthetic import create_zoo
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates enclosures, species, animals, groups and years of daily counts "
+        "from several users, all named with a prefix"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--enclosures", type=int, default=20)
+        parser.add_argument("--species", type=int, default=50)
+        parser.add_argument(
+            "--animals", type=int, default=30, help="animals per enclosure"
+        )
+        parser.add_argument(
+            "--groups", type=int, default=5, help="groups per enclosure"
+        )
+        parser.add_argument("--years", type=int, default=3)
+        parser.add_argument("--users", type=int, default=5)
+        parser.add_argument(
+            "--prefix",
+            default="synthetic",
+            help="prefix for the names of everything created",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        zoo = create_zoo(
+            num_enclosures=options["enclosures"],
+            num_species=options["species"],
+            num_animals=options["animals"],
+            num_groups=options["groups"],
+            years=options["years"],
+            num_users=options["users"],
+            prefix=options["prefix"],
+            seed=options["seed"],
+        )
+
+        for name in ("users", "species", "enclosures", "animals", "groups"):
+            self.stdout.write(f"{len(zoo[name])} {name}")
+        for name, num in zoo["num_counts"].items():
+            self.stdout.write(f"{num} {name}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created zoo, users are in the role '{options['prefix']} role'"
+            )
+        )
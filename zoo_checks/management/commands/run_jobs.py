@@ -0,0 +1,65 @@
+"""Worker for the background ingest/export jobs (see zoo_checks/jobs.py)"""
+
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from zoo_checks.jobs import run_next_job
+from zoo_checks.models import Job
+
+# seconds between cleanups of old jobs
+CLEANUP_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = "runs the queued ingest/export jobs, polling the job table for new ones"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="exit once there are no queued jobs",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=1.0,
+            help="seconds to wait before polling again when there are no jobs",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        handlers = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+
+        num_run = 0
+        last_cleanup = None
+        while not self.stopping:
+            now = time.monotonic()
+            if last_cleanup is None or now - last_cleanup > CLEANUP_INTERVAL:
+                Job.cleanup()
+                last_cleanup = now
+
+            job = run_next_job()
+            if job is not None:
+                num_run += 1
+                self.stdout.write(f"{job.kind} job {job.token}: {job.status}")
+                continue
+
+            if options["burst"]:
+                break
+            time.sleep(options["sleep"])
+            # like the end of a request, the connection may be obsolete by now
+            close_old_connections()
+
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(f"Ran {num_run} jobs"))
+
+    def stop(self, signum, frame):
+        """finish the running job, then exit"""
+        self.stopping = True
@@ -0,0 +1,45 @@
+"""Warms or clears the zootable caches (see zoo_checks/cache.py)"""
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from zoo_checks import cache as zoo_cache
+from zoo_checks.models import DailyEnclosureSummary, Enclosure
+
+
+class Command(BaseCommand):
+    help = (
+        "warm: caches the rosters and today's summaries of every enclosure, "
+        "clear: invalidates everything cached"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["warm", "clear"])
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="clear: empty the whole cache, not only the zootable values",
+        )
+
+    def handle(self, *args, **options):
+        if options["action"] == "clear":
+            if options["all"]:
+                cache.clear()
+            else:
+                zoo_cache.clear()
+            self.stdout.write(self.style.SUCCESS("Cleared the cache"))
+            return
+
+        enclosures = list(
+            Enclosure.objects.filter(
+                Q(animals__active=True) | Q(groups__active=True)
+            ).distinct()
+        )
+        for enclosure in enclosures:
+            zoo_cache.get_roster(enclosure)
+        DailyEnclosureSummary.for_enclosures(enclosures)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Warmed the cache for {len(enclosures)} enclosures")
+        )
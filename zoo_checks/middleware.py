@@ -0,0 +1,116 @@
+"""request instrumentation"""
+
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+baselogger = logging.getLogger("zootable")
+LOGGER = baselogger.getChild(__name__)
+
+
+class QueryStats:
+    """execute_wrapper that counts the queries and the time spent in the database"""
+
+    def __init__(self):
+        self.num_queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.num_queries += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self) -> int:
+        """queries that repeat an earlier statement (usually N+1 loops)"""
+        return sum(num - 1 for num in self.statements.values())
+
+
+def query_threshold(view_name) -> int | None:
+    """max number of queries for a view before warning, None to never warn"""
+    thresholds = getattr(settings, "QUERY_COUNT_THRESHOLDS", {})
+    return thresholds.get(view_name, getattr(settings, "QUERY_COUNT_THRESHOLD", None))
+
+
+def count_queries(stats) -> ExitStack:
+    """context counting the queries of every database connection into stats"""
+    stack = ExitStack()
+    for conn in connections.all():
+        stack.enter_context(conn.execute_wrapper(stats))
+    return stack
+
+
+class QueryCountMiddleware:
+    """Counts the queries, duplicate queries and db time of each request
+
+    Logs a line per request to the zootable logger, warning when the view is over
+    its threshold (`QUERY_COUNT_THRESHOLDS`/`QUERY_COUNT_THRESHOLD` settings), and
+    adds a Server-Timing header so the numbers show up in the browser dev tools.
+
+    The content of a streaming response (e.g. a csv export) is read from the
+    database as it is sent, after the headers. Its queries are counted and logged
+    once it has been sent, and it has no Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        start = time.perf_counter()
+        with count_queries(stats):
+            response = self.get_response(request)
+
+        if response.streaming and not response.is_async:
+            response.streaming_content = self.stream(
+                response.streaming_content, request, response, stats, start
+            )
+            return response
+
+        total_time = time.perf_counter() - start
+        self.log(request, response, stats, total_time)
+        response["Server-Timing"] = (
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.num_queries} queries", '
+            f"total;dur={total_time * 1000:.1f}"
+        )
+        return response
+
+    def stream(self, content, request, response, stats, start):
+        """the response's content, counting the queries while it is sent"""
+        try:
+            with count_queries(stats):
+                yield from content
+        finally:
+            self.log(request, response, stats, time.perf_counter() - start)
+
+    def log(self, request, response, stats, total_time):
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+
+        message = (
+            "path=%s view=%s status=%s queries=%s duplicates=%s "
+            "db_ms=%.1f total_ms=%.1f"
+        )
+        args = (
+            request.path,
+            view_name,
+            response.status_code,
+            stats.num_queries,
+            stats.duplicates,
+            stats.db_time * 1000,
+            total_time * 1000,
+        )
+        threshold = query_threshold(view_name)
+        if threshold is not None and stats.num_queries > threshold:
+            LOGGER.warning(message + " threshold=%s", *args, threshold)
+        else:
+            LOGGER.info(message, *args)
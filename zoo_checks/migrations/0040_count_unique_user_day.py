@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 10:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_counts(apps, schema_editor):
+    """keep only the latest count for each user, datecounted, object, enclosure"""
+    for model_name, object_field in (
+        ("AnimalCount", "animal"),
+        ("GroupCount", "group"),
+        ("SpeciesCount", "species"),
+    ):
+        model = apps.get_model("zoo_checks", model_name)
+        key = ["user_id", "datecounted", f"{object_field}_id", "enclosure_id"]
+
+        # nulls are never equal for the constraint, so those rows can stay
+        counts = model.objects.filter(user__isnull=False, enclosure__isnull=False)
+        latest_ids = (
+            counts.order_by(*key, "-datetimecounted", "-id")
+            .distinct(*key)
+            .values("id")
+        )
+        counts.exclude(id__in=latest_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zoo_checks', '0012_auto_20190609_0013_squashed_0039_auto_20200724_2335'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_counts, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='animalcount',
+            constraint=models.UniqueConstraint(fields=('user', 'datecounted', 'animal', 'enclosure'), name='unique_animalcount_user_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupcount',
+            constraint=models.UniqueConstraint(fields=('user', 'datecounted', 'group', 'enclosure'), name='unique_groupcount_user_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='speciescount',
+            constraint=models.UniqueConstraint(fields=('user', 'datecounted', 'species', 'enclosure'), name='unique_speciescount_user_day'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 10:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zoo_checks', '0040_count_unique_user_day'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='animalcount',
+            index=models.Index(fields=['animal', '-datetimecounted', '-id'], include=('condition',), name='animalcount_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='animalcount',
+            index=models.Index(fields=['enclosure', 'datetimecounted'], name='animalcount_enclosure_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupcount',
+            index=models.Index(fields=['group', '-datetimecounted', '-id'], name='groupcount_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='groupcount',
+            index=models.Index(fields=['enclosure', 'datetimecounted'], name='groupcount_enclosure_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='speciescount',
+            index=models.Index(fields=['species', 'enclosure', '-datetimecounted', '-id'], name='speciescount_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='speciescount',
+            index=models.Index(fields=['enclosure', 'datetimecounted'], name='speciescount_enclosure_day_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 10:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zoo_checks', '0041_count_latest_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyEnclosureSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_animals', models.PositiveIntegerField(default=0)),
+                ('num_groups', models.PositiveIntegerField(default=0)),
+                ('total_groups', models.PositiveIntegerField(default=0)),
+                ('observed_animals', models.PositiveIntegerField(default=0)),
+                ('animals_bar', models.PositiveIntegerField(default=0)),
+                ('animals_seen', models.PositiveIntegerField(default=0)),
+                ('animals_attn', models.PositiveIntegerField(default=0)),
+                ('animals_absent', models.PositiveIntegerField(default=0)),
+                ('animals_not_observed', models.PositiveIntegerField(default=0)),
+                ('groups_seen', models.PositiveIntegerField(default=0)),
+                ('groups_bar', models.PositiveIntegerField(default=0)),
+                ('groups_needs_attn', models.PositiveIntegerField(default=0)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('enclosure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='zoo_checks.enclosure')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('enclosure', 'date'), name='unique_enclosure_summary_day')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('zoo_checks', '0044_job'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='job',
+            name='result_file',
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='result_file',
+            field=models.FileField(blank=True, upload_to='exports/'),
+        ),
+    ]
@@ -1,13 +1,23 @@
+import json
+import uuid
+import zlib
 from datetime import datetime
 from itertools import chain
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import models, transaction
 from django.db.models.functions import Upper
 from django.utils import timezone
 from django_extensions.db.fields import AutoSlugField
 
+from .cache import (
+    delete_chart_data,
+    delete_summary,
+    get_summaries,
+    set_summaries,
+)
 from .helpers import today_time
 
 
@@ -38,6 +48,47 @@ class Enclosure(models.Model):
 
         return animals, groups
 
+    @classmethod
+    def visible_ids(cls, enclosure_ids=None, role=None) -> list:
+        """ids of the enclosures with active animals or groups, in name order
+
+        only those in enclosure_ids and in the role's enclosures, if given
+        """
+        query = cls.objects.filter(
+            models.Exists(
+                Animal.objects.filter(enclosure=models.OuterRef("pk"), active=True)
+            )
+            | models.Exists(
+                Group.objects.filter(enclosure=models.OuterRef("pk"), active=True)
+            )
+        )
+        if enclosure_ids is not None:
+            query = query.filter(id__in=enclosure_ids)
+        if role is not None:
+            query = query.filter(roles=role)
+        return list(query.values_list("id", flat=True))
+
+    def roster(self) -> dict:
+        """the active species, animals and groups, in the order of the tally page
+
+        lists, so they can be cached (see zoo_checks.cache.get_roster)
+        """
+        animals = (
+            self.animals.filter(active=True)
+            .order_by("species__common_name", "name", "accession_number")
+            .select_related("species")
+        )
+        groups = (
+            self.groups.filter(active=True)
+            .order_by("species__common_name", "accession_number")
+            .select_related("species")
+        )
+        return {
+            "species": list(self.species().order_by("common_name")),
+            "animals": list(animals),
+            "groups": list(groups),
+        }
+
     def accession_numbers_observed(self, day=None):
         if day is None:
             day = today_time()
@@ -123,6 +174,32 @@ class Enclosure(models.Model):
 
         return animal_counts, group_counts
 
+    def prior_history(
+        self, species, groups, animals, prior_days=3, ref_date=None
+    ) -> dict:
+        """
+        prior counts for the enclosure's species, groups and animals
+        This does only 3 queries to the database (one for each type of count)
+
+        Returns a dict with keys "species", "groups" and "animals"
+        each a dict of object id to its list of prior counts
+        """
+
+        if ref_date is None:
+            ref_date = today_time()
+
+        return {
+            "species": SpeciesCount.prior_counts(
+                species, self, prior_days=prior_days, ref_date=ref_date
+            ),
+            "groups": GroupCount.prior_counts(
+                groups, prior_days=prior_days, ref_date=ref_date
+            ),
+            "animals": AnimalCount.prior_counts(
+                animals, prior_days=prior_days, ref_date=ref_date
+            ),
+        }
+
     class Meta:
         ordering = [Upper("name")]
 
@@ -194,45 +271,9 @@ class Species(models.Model):
     def prior_counts(self, enclosure, prior_days=3, ref_date=None):
         """get all the prior counts returned in a list using a single query"""
 
-        if ref_date is None:
-            ref_date = today_time()
-
-        # we get the min and max days to search over
-        min_day = ref_date - timezone.timedelta(days=prior_days)
-        max_day = ref_date
-
-        # perform the query, returning only the latest counts, and distinct on dates
-        # need to sort by id because edited counts have the same date/datetimes
-        counts_q = (
-            self.counts.filter(
-                datetimecounted__gte=min_day,
-                datetimecounted__lt=max_day,
-                enclosure=enclosure,
-            )
-            .order_by("-datecounted", "-datetimecounted", "-id")
-            .distinct("datecounted")
-        )
-
-        # create the dict to index into
-        if counts_q:
-            counts_dict = {q.datecounted: q.count for q in counts_q}
-        else:
-            counts_dict = {}
-
-        # iterate over the days and return
-        counts = [0] * prior_days
-        for p in range(prior_days):
-            daytime = ref_date - timezone.timedelta(days=p + 1)
-            day = ref_date.date() - timezone.timedelta(days=p + 1)
-            day_count = counts_dict.get(day)
-
-            counts[p] = (
-                {"count": day_count, "day": daytime}
-                if day_count
-                else {"count": 0, "day": daytime}
-            )
-
-        return counts
+        return SpeciesCount.prior_counts(
+            [self], enclosure, prior_days=prior_days, ref_date=ref_date
+        )[self.id]
 
 
 class AnimalSet(models.Model):
@@ -258,10 +299,9 @@ class AnimalSet(models.Model):
                 continue
 
             # the change from model_to_dict(obj):
+            # (uses the related object cache, select_related to avoid a query)
             if f.is_relation:
-                data[f.name] = str(
-                    f.related_model.objects.get(pk=f.value_from_object(self))
-                )
+                data[f.name] = str(getattr(self, f.name))
             else:
                 data[f.name] = f.value_from_object(self)
 
@@ -277,8 +317,13 @@ class Animal(AnimalSet):
     identifier = models.CharField(max_length=200)
     sex = models.CharField(max_length=1, choices=SEX, default="U")
 
+    # ingest sets the slug to skip the uniqueness query for each new animal
     slug = AutoSlugField(
-        null=True, default=None, populate_from=["accession_number"], unique=True
+        null=True,
+        default=None,
+        populate_from=["accession_number"],
+        unique=True,
+        overwrite_on_add=False,
     )
 
     enclosure = models.ForeignKey(
@@ -325,40 +370,11 @@ class Animal(AnimalSet):
             return ""
 
     def prior_conditions(self, prior_days=3, ref_date=None):
-        """Given a set of animals, returns their counts from the prior N days"""
-
-        if ref_date is None:
-            ref_date = today_time()
-
-        # we get the min and max days to search over
-        min_day = ref_date - timezone.timedelta(days=prior_days)
-        max_day = ref_date
-
-        # perform the query, returning only the latest counts, and distinct on dates
-        # need to sort by id because edited counts have the same date/datetimes
-        counts_q = (
-            self.conditions.filter(
-                datetimecounted__gte=min_day, datetimecounted__lt=max_day
-            )
-            .order_by("-datecounted", "-datetimecounted", "-id")
-            .distinct("datecounted")
-        )
-
-        # create the dict to index into
-        if counts_q:
-            counts_dict = {q.datecounted: q for q in counts_q}
-        else:
-            counts_dict = {}
+        """Returns the animal's counts from the prior N days"""
 
-        conds = [""] * prior_days
-        for p in range(prior_days):
-            daytime = ref_date - timezone.timedelta(days=p + 1)
-            day = ref_date.date() - timezone.timedelta(days=p + 1)
-
-            count = counts_dict.get(day)
-            conds[p] = {"count": count, "day": daytime}
-
-        return conds
+        return AnimalCount.prior_counts(
+            [self], prior_days=prior_days, ref_date=ref_date
+        )[self.id]
 
 
 class Group(AnimalSet):
@@ -369,8 +385,13 @@ class Group(AnimalSet):
     population_unknown = models.PositiveSmallIntegerField(default=0)
     population_total = models.PositiveSmallIntegerField(default=0)
 
+    # ingest sets the slug to skip the uniqueness query for each new group
     slug = AutoSlugField(
-        null=True, default=None, populate_from="accession_number", unique=True
+        null=True,
+        default=None,
+        populate_from="accession_number",
+        unique=True,
+        overwrite_on_add=False,
     )
 
     enclosure = models.ForeignKey(
@@ -406,52 +427,143 @@ class Group(AnimalSet):
     def prior_counts(self, prior_days=3, ref_date=None):
         """Prior counts using a single query"""
 
-        if ref_date is None:
-            ref_date = today_time()
+        return GroupCount.prior_counts(
+            [self], prior_days=prior_days, ref_date=ref_date
+        )[self.id]
+
+
+class Count(models.Model):
+    # name of the foreign key to the counted object, set by subclasses
+    object_field = None
+    # subclasses also define form_defaults(), the fields a form saving over an
+    # existing count updates
+
+    datetimecounted = models.DateTimeField(default=timezone.now, db_index=True)
+    datecounted = models.DateField(default=timezone.localdate, db_index=True)
+
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    enclosure = models.ForeignKey(Enclosure, on_delete=models.SET_NULL, null=True)
+
+    class Meta:
+        abstract = True
+        ordering = ["datetimecounted"]
+
+    @classmethod
+    def latest_per_day_query(cls, object_field, objs, prior_days, ref_date, **filters):
+        """Queryset of the latest count for each (object, day) in the prior days"""
 
         # we get the min and max days to search over
         min_day = ref_date - timezone.timedelta(days=prior_days)
         max_day = ref_date
 
-        # perform the query, returning only the latest counts, and distinct on dates
+        # returning only the latest counts, distinct on object and dates
         # need to sort by id because edited counts have the same date/datetimes
-        counts_q = (
-            self.counts.filter(
-                datetimecounted__gte=min_day, datetimecounted__lt=max_day
+        object_id = f"{object_field}_id"
+        return (
+            cls.objects.filter(
+                **{f"{object_field}__in": objs},
+                datetimecounted__gte=min_day,
+                datetimecounted__lt=max_day,
+                **filters,
             )
-            .order_by("-datecounted", "-datetimecounted", "-id")
-            .distinct("datecounted")
+            .order_by(object_id, "-datecounted", "-datetimecounted", "-id")
+            .distinct(object_id, "datecounted")
         )
 
-        # create the dict to index into
-        if counts_q:
-            counts_dict = {q.datecounted: q for q in counts_q}
-        else:
-            counts_dict = {}
+    @classmethod
+    def latest_per_day(cls, object_field, objs, prior_days, ref_date, **filters):
+        """Latest count for each (object, day) in the prior days, using a single query
+
+        Returns a dict keyed by (object id, date counted)
+        """
+
+        counts_q = cls.latest_per_day_query(
+            object_field, objs, prior_days, ref_date, **filters
+        )
+        object_id = f"{object_field}_id"
 
-        counts = [0] * prior_days
-        for p in range(prior_days):
-            daytime = ref_date - timezone.timedelta(days=p + 1)
-            day = ref_date.date() - timezone.timedelta(days=p + 1)
+        return {(getattr(c, object_id), c.datecounted): c for c in counts_q}
 
-            counts[p] = {"count": counts_dict.get(day), "day": daytime}
+    @classmethod
+    def prior_history(cls, object_field, objs, prior_days, ref_date, **filters):
+        """Dense prior history for a list of objects
 
-        return counts
+        Returns a dict keyed by object id, each value a list (most recent first) of
+        {"count": count or None, "day": datetime} for each of the prior days
+        """
 
+        if ref_date is None:
+            ref_date = today_time()
 
-class Count(models.Model):
-    datetimecounted = models.DateTimeField(default=timezone.now, db_index=True)
-    datecounted = models.DateField(default=timezone.localdate, db_index=True)
+        counts_dict = cls.latest_per_day(
+            object_field, objs, prior_days, ref_date, **filters
+        )
 
-    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
-    enclosure = models.ForeignKey(Enclosure, on_delete=models.SET_NULL, null=True)
+        days = [
+            (
+                ref_date - timezone.timedelta(days=p + 1),
+                ref_date.date() - timezone.timedelta(days=p + 1),
+            )
+            for p in range(prior_days)
+        ]
+
+        return {
+            obj.id: [
+                {"count": counts_dict.get((obj.id, day)), "day": daytime}
+                for daytime, day in days
+            ]
+            for obj in objs
+        }
+
+    def form_key(self) -> tuple:
+        """identifies the count a form saves to: user, datecounted, object, enclosure"""
+        return (
+            self.user_id,
+            self.datecounted,
+            getattr(self, f"{self.object_field}_id"),
+            self.enclosure_id,
+        )
 
-    class Meta:
-        abstract = True
-        ordering = ["datetimecounted"]
+    def update_or_create_from_form(self):
+        """Creates the count, or updates the count this form saves to if one exists
+
+        A single INSERT ... ON CONFLICT DO UPDATE statement, safe for concurrent saves
+        """
+        self.bulk_update_or_create_from_form([self])
+        DailyEnclosureSummary.refresh_for_counts([self])
+
+    @classmethod
+    def bulk_update_or_create_from_form(cls, instances):
+        """update_or_create_from_form for a list of (unsaved) counts
+
+        All the counts are written with a single INSERT ... ON CONFLICT DO UPDATE
+        on the form key unique constraint
+        """
+
+        # an upsert cannot update the same row twice, the last instance wins
+        instances = {c.form_key(): c for c in instances}
+        if not instances:
+            return
+
+        for instance in instances.values():
+            defaults = instance.form_defaults()
+            for field, value in defaults.items():
+                setattr(instance, field, value)
+
+        counts = list(instances.values())
+        cls.objects.bulk_create(
+            counts,
+            update_conflicts=True,
+            unique_fields=["user", "datecounted", cls.object_field, "enclosure"],
+            update_fields=list(defaults.keys()),
+        )
+        # once the counts are committed, not to cache the charts without them
+        transaction.on_commit(lambda: delete_chart_data(counts))
 
 
 class AnimalCount(Count):
+    object_field = "animal"
+
     SEEN = "SE"
     NEEDSATTENTION = "NA"
     BAR = "BA"  # bright active responsive
@@ -478,6 +590,28 @@ class AnimalCount(Count):
         Animal, on_delete=models.CASCADE, related_name="conditions"
     )
 
+    class Meta(Count.Meta):
+        constraints = [
+            # the identifier a count form saves to
+            models.UniqueConstraint(
+                fields=["user", "datecounted", "animal", "enclosure"],
+                name="unique_animalcount_user_day",
+            )
+        ]
+        indexes = [
+            # latest count(s) of an object: count_on_day, prior counts, history
+            models.Index(
+                fields=["animal", "-datetimecounted", "-id"],
+                name="animalcount_latest_idx",
+                include=["condition"],
+            ),
+            # counts in an enclosure on a day: all_counts, counts_on_day
+            models.Index(
+                fields=["enclosure", "datetimecounted"],
+                name="animalcount_enclosure_day_idx",
+            ),
+        ]
+
     def __str__(self):
         return "|".join(
             (
@@ -505,25 +639,25 @@ class AnimalCount(Count):
             .distinct("animal__accession_number")
         )
 
-    def update_or_create_from_form(self):
-        # we want the identifier to be:
-        # user, datecounted, animal, enclosure?
-        AnimalCount.objects.update_or_create(
-            user=self.user,
-            datecounted=self.datecounted,
-            animal=self.animal,
-            enclosure=self.enclosure,
-            # The update_or_create method tries to fetch an object from database based on the given kwargs.
-            # If a match is found, it updates the fields passed in the defaults dictionary.
-            defaults={
-                "datetimecounted": self.datetimecounted,
-                "condition": self.condition,
-                "comment": self.comment,
-            },
-        )
+    @classmethod
+    def prior_counts(cls, animals, prior_days=3, ref_date=None) -> dict:
+        """Returns the counts from the prior N days for a list of animals
+
+        keys are animal ids, values are lists of {"count": count or None, "day"}
+        """
+        return cls.prior_history("animal", animals, prior_days, ref_date)
+
+    def form_defaults(self) -> dict:
+        return {
+            "datetimecounted": self.datetimecounted,
+            "condition": self.condition,
+            "comment": self.comment,
+        }
 
 
 class GroupCount(Count):
+    object_field = "group"
+
     count_total = models.PositiveSmallIntegerField(default=0)
     count_seen = models.PositiveSmallIntegerField(default=0)
     count_not_seen = models.PositiveSmallIntegerField(default=0)
@@ -533,6 +667,27 @@ class GroupCount(Count):
 
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name="counts")
 
+    class Meta(Count.Meta):
+        constraints = [
+            # the identifier a count form saves to
+            models.UniqueConstraint(
+                fields=["user", "datecounted", "group", "enclosure"],
+                name="unique_groupcount_user_day",
+            )
+        ]
+        indexes = [
+            # latest count(s) of an object: count_on_day, prior counts, history
+            models.Index(
+                fields=["group", "-datetimecounted", "-id"],
+                name="groupcount_latest_idx",
+            ),
+            # counts in an enclosure on a day: all_counts, counts_on_day
+            models.Index(
+                fields=["enclosure", "datetimecounted"],
+                name="groupcount_enclosure_day_idx",
+            ),
+        ]
+
     def __str__(self):
         return "|".join(
             (
@@ -561,35 +716,56 @@ class GroupCount(Count):
             .distinct("group__accession_number")
         )
 
-    def update_or_create_from_form(self):
-        # tries to get obj from db using kwargs, if found, updates with "defaults"
-        # https://docs.djangoproject.com/en/dev/ref/models/querysets/#update-or-create
-        # we want the identifier to be:
-        # user, datecounted, group, enclosure
-        GroupCount.objects.update_or_create(
-            user=self.user,
-            datecounted=self.datecounted,
-            group=self.group,
-            enclosure=self.enclosure,
-            defaults={
-                "datetimecounted": self.datetimecounted,
-                "count_total": self.count_total,
-                "count_seen": self.count_seen,
-                "count_not_seen": max(0, self.count_total - self.count_seen),
-                "count_bar": self.count_bar,
-                "needs_attn": self.needs_attn,
-                "comment": self.comment,
-            },
-        )
+    @classmethod
+    def prior_counts(cls, groups, prior_days=3, ref_date=None) -> dict:
+        """Returns the counts from the prior N days for a list of groups
+
+        keys are group ids, values are lists of {"count": count or None, "day"}
+        """
+        return cls.prior_history("group", groups, prior_days, ref_date)
+
+    def form_defaults(self) -> dict:
+        return {
+            "datetimecounted": self.datetimecounted,
+            "count_total": self.count_total,
+            "count_seen": self.count_seen,
+            "count_not_seen": max(0, self.count_total - self.count_seen),
+            "count_bar": self.count_bar,
+            "needs_attn": self.needs_attn,
+            "comment": self.comment,
+        }
 
 
 class SpeciesCount(Count):
+    object_field = "species"
+
     count = models.PositiveSmallIntegerField(default=0)
 
     species = models.ForeignKey(
         Species, on_delete=models.CASCADE, related_name="counts"
     )
 
+    class Meta(Count.Meta):
+        constraints = [
+            # the identifier a count form saves to
+            models.UniqueConstraint(
+                fields=["user", "datecounted", "species", "enclosure"],
+                name="unique_speciescount_user_day",
+            )
+        ]
+        indexes = [
+            # latest count(s) of an object: count_on_day, prior counts, history
+            models.Index(
+                fields=["species", "enclosure", "-datetimecounted", "-id"],
+                name="speciescount_latest_idx",
+            ),
+            # counts in an enclosure on a day: all_counts, counts_on_day
+            models.Index(
+                fields=["enclosure", "datetimecounted"],
+                name="speciescount_enclosure_day_idx",
+            ),
+        ]
+
     def __str__(self):
         return "|".join(
             (
@@ -617,13 +793,383 @@ class SpeciesCount(Count):
             .distinct("species__common_name")
         )
 
-    def update_or_create_from_form(self):
-        # we want the identifier to be:
-        # user, datecounted, group, enclosure?
-        SpeciesCount.objects.update_or_create(
-            user=self.user,
-            datecounted=self.datecounted,
-            species=self.species,
-            enclosure=self.enclosure,
-            defaults={"datetimecounted": self.datetimecounted, "count": self.count},
+    @classmethod
+    def prior_counts(cls, species, enclosure, prior_days=3, ref_date=None) -> dict:
+        """Returns the count values from the prior N days for a list of species
+
+        keys are species ids, values are lists of {"count": int, "day"}
+        missing counts default to 0
+        """
+        history = cls.prior_history(
+            "species", species, prior_days, ref_date, enclosure=enclosure
+        )
+        for prior_counts in history.values():
+            for daycount in prior_counts:
+                count = daycount["count"]
+                daycount["count"] = count.count if count else 0
+        return history
+
+    def form_defaults(self) -> dict:
+        return {"datetimecounted": self.datetimecounted, "count": self.count}
+
+
+class DailyEnclosureSummary(models.Model):
+    """Tallies of an enclosure's counts on a day, for the home page
+
+    Refreshed whenever counts are saved from a form or an ingest changes the
+    animals/groups. Saving/deleting single objects (admin, scripts) deletes the
+    summary instead, and it is recomputed the next time it is needed.
+    """
+
+    # animal condition: summary field
+    CONDITION_FIELDS = {
+        AnimalCount.BAR: "animals_bar",
+        AnimalCount.SEEN: "animals_seen",
+        AnimalCount.NEEDSATTENTION: "animals_attn",
+        AnimalCount.ABSENT: "animals_absent",
+        AnimalCount.NOT_OBSERVED: "animals_not_observed",
+    }
+
+    enclosure = models.ForeignKey(
+        Enclosure, on_delete=models.CASCADE, related_name="daily_summaries"
+    )
+    date = models.DateField()
+
+    # active animals/groups
+    total_animals = models.PositiveIntegerField(default=0)
+    num_groups = models.PositiveIntegerField(default=0)
+    total_groups = models.PositiveIntegerField(default=0)  # group populations
+
+    observed_animals = models.PositiveIntegerField(default=0)
+    animals_bar = models.PositiveIntegerField(default=0)
+    animals_seen = models.PositiveIntegerField(default=0)
+    animals_attn = models.PositiveIntegerField(default=0)
+    animals_absent = models.PositiveIntegerField(default=0)
+    animals_not_observed = models.PositiveIntegerField(default=0)
+
+    groups_seen = models.PositiveIntegerField(default=0)
+    groups_bar = models.PositiveIntegerField(default=0)
+    groups_needs_attn = models.PositiveIntegerField(default=0)
+
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["enclosure", "date"], name="unique_enclosure_summary_day"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.enclosure_id}|{self.date}"
+
+    def animal_conditions(self) -> dict:
+        """condition names: number of animals, in the order of AnimalCount.CONDITIONS"""
+        return {
+            name: getattr(self, self.CONDITION_FIELDS[cond])
+            for cond, name in AnimalCount.CONDITIONS
+        }
+
+    def group_counts(self) -> dict:
+        return {
+            "Seen": self.groups_seen,
+            "BAR": self.groups_bar,
+            "Needs Attn": self.groups_needs_attn,
+        }
+
+    @property
+    def group_count_total(self) -> int:
+        return self.groups_seen + self.groups_bar
+
+    @staticmethod
+    def day_start(date):
+        """start of the (local) day as a datetime, like today_time()"""
+        return timezone.make_aware(datetime.combine(date, datetime.min.time()))
+
+    @classmethod
+    def compute(cls, enclosure_ids, date) -> dict:
+        """Computes (unsaved) summaries from the counts on the day
+
+        4 queries regardless of the number of enclosures
+
+        Returns a dict of enclosure id: summary
+        """
+        summaries = {
+            enc_id: cls(enclosure_id=enc_id, date=date) for enc_id in enclosure_ids
+        }
+        if not summaries:
+            return summaries
+
+        animal_totals = (
+            Animal.objects.filter(enclosure__in=summaries.keys(), active=True)
+            .order_by()
+            .values_list("enclosure_id")
+            .annotate(models.Count("id"))
+        )
+        for enc_id, num in animal_totals:
+            summaries[enc_id].total_animals = num
+
+        group_totals = (
+            Group.objects.filter(enclosure__in=summaries.keys(), active=True)
+            .order_by()
+            .values_list("enclosure_id")
+            .annotate(models.Count("id"), models.Sum("population_total"))
+        )
+        for enc_id, num, population in group_totals:
+            summaries[enc_id].num_groups = num
+            summaries[enc_id].total_groups = population
+
+        observed = {cond for cond, _ in AnimalCount.OBSERVED_CONDITIONS}
+        animal_counts, group_counts = Enclosure.all_counts(
+            summaries.keys(), cls.day_start(date)
+        )
+        for enc_id, condition in animal_counts.values_list("enclosure_id", "condition"):
+            summary = summaries[enc_id]
+            if condition in cls.CONDITION_FIELDS:
+                field = cls.CONDITION_FIELDS[condition]
+                setattr(summary, field, getattr(summary, field) + 1)
+            summary.observed_animals += condition in observed
+
+        for enc_id, seen, bar, needs_attn in group_counts.values_list(
+            "enclosure_id", "count_seen", "count_bar", "needs_attn"
+        ):
+            summary = summaries[enc_id]
+            summary.groups_seen += seen
+            summary.groups_bar += bar
+            summary.groups_needs_attn += needs_attn
+
+        return summaries
+
+    @classmethod
+    def refresh(cls, enclosure_ids, date) -> dict:
+        """Recomputes and saves the summaries of the enclosures on the day"""
+        summaries = cls.compute(set(enclosure_ids), date)
+        if summaries:
+            fields = [
+                f.name
+                for f in cls._meta.concrete_fields
+                if f.name not in ("id", "enclosure", "date")
+            ]
+            cls.objects.bulk_create(
+                summaries.values(),
+                update_conflicts=True,
+                unique_fields=["enclosure", "date"],
+                update_fields=fields,
+            )
+            set_summaries(summaries.values())
+        return summaries
+
+    @classmethod
+    def refresh_for_counts(cls, counts):
+        """refreshes the summaries of the enclosures/days of the saved counts
+
+        species counts are not part of the summaries and are skipped
+        """
+        enclosures_by_date = {}
+        for count in counts:
+            summarized = isinstance(count, (AnimalCount, GroupCount))
+            if summarized and count.enclosure_id is not None:
+                date = timezone.localdate(count.datetimecounted)
+                enclosures_by_date.setdefault(date, set()).add(count.enclosure_id)
+        for date, enclosure_ids in enclosures_by_date.items():
+            cls.refresh(enclosure_ids, date)
+
+    @classmethod
+    def for_enclosures(cls, enclosures, date=None) -> dict:
+        """Summaries of the enclosures on the day, computing any that are missing
+
+        From the cache, then the table
+
+        Returns a dict of enclosure id: summary
+        """
+        if date is None:
+            date = today_time().date()
+
+        enclosure_ids = {enc.id for enc in enclosures}
+        summaries = get_summaries(enclosure_ids, date)
+
+        missing = enclosure_ids - summaries.keys()
+        if missing:
+            stored = cls.objects.filter(enclosure__in=missing, date=date)
+            set_summaries(stored)
+            summaries.update({s.enclosure_id: s for s in stored})
+
+        missing = enclosure_ids - summaries.keys()
+        if missing:
+            summaries.update(cls.refresh(missing, date))
+        return summaries
+
+    @classmethod
+    def invalidate(cls, enclosure_id, date=None):
+        """deletes a summary that is out of date"""
+        if date is None:
+            date = today_time().date()
+        cls.objects.filter(enclosure_id=enclosure_id, date=date).delete()
+        delete_summary(enclosure_id, date)
+
+
+class StagedUpload(models.Model):
+    """Changesets of an upload, until the upload is confirmed
+
+    Stored as compressed JSON instead of in the session, the session has the token
+    """
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="staged_uploads", null=True
+    )
+    upload_file = models.CharField(max_length=255)
+    data = models.BinaryField()
+    created = models.DateTimeField(auto_now_add=True)
+    expires = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.upload_file} ({self.token})"
+
+    @property
+    def changesets(self) -> dict:
+        return json.loads(zlib.decompress(self.data))
+
+    @classmethod
+    def stage(cls, changesets, upload_file, user=None):
+        """stores the changesets, and cleans up any expired uploads"""
+        cls.cleanup()
+        return cls.objects.create(
+            user=user,
+            upload_file=upload_file,
+            data=zlib.compress(json.dumps(changesets, separators=(",", ":")).encode()),
+            expires=timezone.now()
+            + timezone.timedelta(seconds=settings.STAGED_UPLOAD_TTL),
+        )
+
+    @classmethod
+    def get_active(cls, token):
+        """the staged upload of a token, None if it expired or doesn't exist"""
+        if token is None:
+            return None
+        try:
+            return cls.objects.get(token=token, expires__gt=timezone.now())
+        except (ObjectDoesNotExist, ValidationError):
+            return None
+
+    @classmethod
+    def cleanup(cls) -> int:
+        """deletes expired uploads, returns the number deleted"""
+        num_deleted, _ = cls.objects.filter(expires__lte=timezone.now()).delete()
+        return num_deleted
+
+
+class Job(models.Model):
+    """A long running ingest/export, run by the run_jobs command (see jobs.py)"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATUS = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+    KINDS = [("ingest", "Ingest"), ("export", "Export")]
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    status = models.CharField(max_length=20, choices=STATUS, default=QUEUED)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="jobs", null=True
+    )
+    params = models.JSONField(default=dict)
+
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+
+    # an ingest report, or the file of an export (in the default storage)
+    result = models.JSONField(null=True, blank=True)
+    result_file = models.FileField(upload_to="exports/", blank=True)
+    result_filename = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created"])]
+
+    def __str__(self):
+        return f"{self.kind} {self.status} ({self.token})"
+
+    @property
+    def done(self) -> bool:
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    @classmethod
+    def enqueue(cls, kind, params, user=None):
+        return cls.objects.create(kind=kind, params=params, user=user)
+
+    @classmethod
+    def claim_next(cls):
+        """marks the oldest queued job as running and returns it, None if none
+
+        locked rows are skipped, so several workers never claim the same job
+        """
+        with transaction.atomic():
+            job = (
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(status=cls.QUEUED)
+                .order_by("created")
+                .first()
+            )
+            if job is None:
+                return None
+            job.status = cls.RUNNING
+            job.started = timezone.now()
+            job.save(update_fields=["status", "started"])
+        return job
+
+    def set_progress(self, progress, total=None, message=None):
+        """saves the progress, seen by the status endpoint while the job runs"""
+        self.progress = progress
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        self.save(update_fields=["progress", "total", "message"])
+
+    def succeed(self, result=None, result_filename=""):
+        self.status = self.SUCCEEDED
+        self.progress = self.total
+        self.result = result
+        self.result_filename = result_filename
+        self.finished = timezone.now()
+        self.save()
+
+    def fail(self, error):
+        self.status = self.FAILED
+        self.error = str(error)
+        self.finished = timezone.now()
+        self.save(update_fields=["status", "error", "finished"])
+
+    @classmethod
+    def cleanup(cls) -> int:
+        """deletes finished jobs older than JOB_RESULT_TTL and their files, fails jobs
+        running for longer than JOB_TIMEOUT (their worker died)
+
+        returns the number deleted
+        """
+        now = timezone.now()
+        cls.objects.filter(
+            status=cls.RUNNING,
+            started__lte=now - timezone.timedelta(seconds=settings.JOB_TIMEOUT),
+        ).update(status=cls.FAILED, error="Timed out", finished=now)
+        expired = cls.objects.filter(
+            status__in=[cls.SUCCEEDED, cls.FAILED],
+            finished__lte=now - timezone.timedelta(seconds=settings.JOB_RESULT_TTL),
         )
+        for job in expired.exclude(result_file=""):
+            job.result_file.delete(save=False)
+        num_deleted, _ = expired.delete()
+        return num_deleted
@@ -0,0 +1,138 @@
+"""Keyset (cursor) pagination
+
+A page is read with a WHERE on the ordering fields of the last row of the previous
+page instead of an OFFSET, so reading a page costs the same however deep it is
+(with an index on the ordering). The ordering has to be unique, so it ends with
+the id. The cursor is the ordering values of that last row, as url safe base64 json.
+Pages before a cursor are read backwards, in the reverse ordering.
+
+There is no COUNT(*) of the rows, so no page numbers or total.
+"""
+
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """a page of objects, with the cursors of the pages before and after it
+
+    a cursor is None when there is no page that way
+    """
+
+    def __init__(self, object_list, paginator, previous_cursor=None, next_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_previous() or self.has_next()
+
+
+class KeysetPaginator:
+    """pages of queryset in the order of ordering, e.g. ("-datetimecounted", "-id")
+
+    every field is sorted the same direction
+    """
+
+    def __init__(self, queryset, ordering=("-datetimecounted", "-id"), per_page=10):
+        descending = {field.startswith("-") for field in ordering}
+        if len(descending) != 1:
+            raise ValueError("ordering fields must all have the same direction")
+        self.descending = descending.pop()
+        self.fields = [field.lstrip("-") for field in ordering]
+        self.queryset = queryset.order_by(*ordering)
+        self.per_page = per_page
+
+    def encode_cursor(self, obj) -> str:
+        opts = self.queryset.model._meta
+        values = [opts.get_field(field).value_to_string(obj) for field in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor) -> list:
+        """the ordering values of the cursor, raises InvalidCursor"""
+        opts = self.queryset.model._meta
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise InvalidCursor("Invalid cursor")
+            return [
+                opts.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError) as e:
+            raise InvalidCursor("Invalid cursor") from e
+
+    def filter_past(self, queryset, values, backwards=False):
+        """the queryset filtered to rows after the ordering values (before them if
+        backwards)
+
+        the range on the first field can use an index, the rest breaks ties
+        """
+        lookup = "lt" if self.descending != backwards else "gt"
+        first, first_value = self.fields[0], values[0]
+        ties = [
+            Q(
+                **{f: v for f, v in zip(self.fields[:i], values[:i])},
+                **{f"{self.fields[i]}__{lookup}": values[i]},
+            )
+            for i in range(len(self.fields))
+        ]
+        return queryset.filter(
+            reduce(or_, ties), **{f"{first}__{lookup}e": first_value}
+        )
+
+    def page(self, after=None, before=None, last=False) -> KeysetPage:
+        """the page after or before a cursor, the last page or the first page
+
+        in one query, with an extra row to know if there are more pages that way
+        """
+        backwards = bool(before) or last
+        queryset = self.queryset.reverse() if backwards else self.queryset
+        cursor = before if backwards else after
+        if cursor:
+            queryset = self.filter_past(
+                queryset, self.decode_cursor(cursor), backwards=backwards
+            )
+
+        object_list = list(queryset[: self.per_page + 1])
+        more = len(object_list) > self.per_page
+        object_list = object_list[: self.per_page]
+        if backwards:
+            object_list.reverse()
+            has_previous, has_next = more, bool(cursor)
+        else:
+            has_previous, has_next = bool(cursor), more
+
+        if not object_list:
+            return KeysetPage(object_list, self)
+        return KeysetPage(
+            object_list,
+            self,
+            previous_cursor=self.encode_cursor(object_list[0])
+            if has_previous
+            else None,
+            next_cursor=self.encode_cursor(object_list[-1]) if has_next else None,
+        )
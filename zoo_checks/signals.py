@@ -0,0 +1,99 @@
+"""keeps derived data in sync when objects are saved/deleted one at a time
+
+bulk writes (count forms, ingest) don't send signals, they refresh it themselves.
+caches are invalidated once the transaction commits, a request in between would
+otherwise cache the old rows again
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .cache import delete_chart_data, invalidate_permissions, invalidate_rosters
+from .models import (
+    Animal,
+    AnimalCount,
+    DailyEnclosureSummary,
+    Enclosure,
+    Group,
+    GroupCount,
+    Role,
+    Species,
+    SpeciesCount,
+)
+
+
+@receiver(post_save, sender=AnimalCount)
+@receiver(post_delete, sender=AnimalCount)
+@receiver(post_save, sender=GroupCount)
+@receiver(post_delete, sender=GroupCount)
+def invalidate_count_summary(sender, instance, **kwargs):
+    if instance.enclosure_id is not None:
+        enclosure_id = instance.enclosure_id
+        date = timezone.localdate(instance.datetimecounted)
+        transaction.on_commit(
+            lambda: DailyEnclosureSummary.invalidate(enclosure_id, date)
+        )
+
+
+@receiver(post_save, sender=AnimalCount)
+@receiver(post_delete, sender=AnimalCount)
+@receiver(post_save, sender=GroupCount)
+@receiver(post_delete, sender=GroupCount)
+@receiver(post_save, sender=SpeciesCount)
+@receiver(post_delete, sender=SpeciesCount)
+def invalidate_count_chart(sender, instance, **kwargs):
+    transaction.on_commit(lambda: delete_chart_data([instance]))
+
+
+@receiver(pre_save, sender=Animal)
+@receiver(pre_save, sender=Group)
+def store_previous_enclosure(sender, instance, **kwargs):
+    # the enclosure it moves out of, if it moves
+    if instance.pk is not None:
+        instance._previous_enclosure_id = (
+            sender.objects.filter(pk=instance.pk)
+            .values_list("enclosure_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Animal)
+@receiver(post_delete, sender=Animal)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_population_summaries(sender, instance, **kwargs):
+    # today's summaries of its enclosure, and of the one it moved out of
+    enclosure_ids = {
+        instance.enclosure_id,
+        getattr(instance, "_previous_enclosure_id", None),
+    } - {None}
+
+    def invalidate():
+        for enclosure_id in enclosure_ids:
+            DailyEnclosureSummary.invalidate(enclosure_id)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Animal)
+@receiver(post_delete, sender=Animal)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Species)
+@receiver(post_delete, sender=Species)
+@receiver(post_save, sender=Enclosure)
+@receiver(post_delete, sender=Enclosure)
+@receiver(post_delete, sender=Role)
+@receiver(m2m_changed, sender=Role.enclosures.through)
+def invalidate_roster_cache(sender, **kwargs):
+    transaction.on_commit(invalidate_rosters)
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(m2m_changed, sender=Role.users.through)
+@receiver(m2m_changed, sender=Role.enclosures.through)
+def invalidate_permissions_cache(sender, **kwargs):
+    transaction.on_commit(invalidate_permissions)
@@ -0,0 +1,236 @@
+"""Synthetic zoo data for local benchmarking
+
+Creates enclosures, species, animals, groups and years of daily counts from
+several users. Everything is named with a prefix so it can be found/removed later.
+"""
+
+import random
+
+from django.utils import timezone
+
+from .helpers import today_time
+from .models import (
+    Animal,
+    AnimalCount,
+    Enclosure,
+    Group,
+    GroupCount,
+    Role,
+    Species,
+    SpeciesCount,
+    User,
+)
+
+BATCH_SIZE = 5000
+
+# roughly how often each condition is recorded
+CONDITION_WEIGHTS = {
+    AnimalCount.BAR: 60,
+    AnimalCount.SEEN: 25,
+    AnimalCount.NEEDSATTENTION: 5,
+    AnimalCount.ABSENT: 5,
+    AnimalCount.NOT_OBSERVED: 5,
+}
+
+
+def bulk_create_batched(model, objs):
+    """bulk_create from a generator without holding every object in memory"""
+    batch = []
+    total = 0
+    for obj in objs:
+        batch.append(obj)
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+        total += len(batch)
+    return total
+
+
+def create_users(num_users, prefix):
+    return [
+        User.objects.get_or_create(username=f"{prefix}_user_{i}")[0]
+        for i in range(num_users)
+    ]
+
+
+def create_species(num_species, prefix):
+    return Species.objects.bulk_create(
+        Species(
+            common_name=f"{prefix} common {i}",
+            class_name=f"{prefix} class {i % 3}",
+            order_name=f"{prefix} order {i % 5}",
+            family_name=f"{prefix} family {i % 7}",
+            genus_name=f"{prefix} genus {i}",
+            species_name=f"{prefix} species {i}",
+        )
+        for i in range(num_species)
+    )
+
+
+def create_enclosures(num_enclosures, users, prefix):
+    enclosures = Enclosure.objects.bulk_create(
+        Enclosure(name=f"{prefix} enclosure {i}") for i in range(num_enclosures)
+    )
+
+    role, _ = Role.objects.get_or_create(name=f"{prefix} role")
+    role.users.add(*users)
+    role.enclosures.add(*enclosures)
+
+    return enclosures
+
+
+def create_animals_groups(enclosures, species, num_animals, num_groups, rng):
+    """animals and groups for each enclosure, from a few of the species
+
+    accession numbers are 6 characters, "S" followed by 5 digits,
+    continuing from any synthetic animals/groups already created
+    """
+    start = (
+        Animal.objects.filter(accession_number__startswith="S").count()
+        + Group.objects.filter(accession_number__startswith="S").count()
+    )
+    accession_numbers = (f"S{n:05d}" for n in range(start, 100000))
+
+    animals, groups = [], []
+    for enc in enclosures:
+        enc_species = rng.sample(species, k=min(len(species), 4))
+        for i in range(num_animals):
+            animals.append(
+                Animal(
+                    name=f"{enc.name} animal {i}",
+                    identifier=f"tag {i}",
+                    sex=rng.choice("MFU"),
+                    accession_number=next(accession_numbers),
+                    species=rng.choice(enc_species),
+                    enclosure=enc,
+                )
+            )
+        for _ in range(num_groups):
+            pop = [rng.randint(0, 10) for _ in range(3)]
+            pop[2] += 2  # groups always have a population > 1
+            groups.append(
+                Group(
+                    accession_number=next(accession_numbers),
+                    species=rng.choice(enc_species),
+                    enclosure=enc,
+                    population_male=pop[0],
+                    population_female=pop[1],
+                    population_unknown=pop[2],
+                    population_total=sum(pop),
+                )
+            )
+
+    return Animal.objects.bulk_create(animals), Group.objects.bulk_create(groups)
+
+
+def count_days(years):
+    """start of each day of the history, oldest first"""
+    today = today_time()
+    for day in range(years * 365, 0, -1):
+        yield today - timezone.timedelta(days=day)
+
+
+def count_time(day, rng):
+    """a random time during the working day"""
+    return day + timezone.timedelta(seconds=rng.randint(8 * 3600, 17 * 3600))
+
+
+def create_counts(animals, groups, years, users, rng) -> dict:
+    """one count per animal/group/species (and enclosure) per day"""
+    conditions = list(CONDITION_WEIGHTS.keys())
+    weights = list(CONDITION_WEIGHTS.values())
+
+    def animal_counts():
+        for day in count_days(years):
+            for animal in animals:
+                datetimecounted = count_time(day, rng)
+                yield AnimalCount(
+                    datetimecounted=datetimecounted,
+                    datecounted=timezone.localdate(datetimecounted),
+                    user=rng.choice(users),
+                    enclosure_id=animal.enclosure_id,
+                    animal=animal,
+                    condition=rng.choices(conditions, weights)[0],
+                )
+
+    def group_counts():
+        for day in count_days(years):
+            for group in groups:
+                datetimecounted = count_time(day, rng)
+                seen = rng.randint(0, group.population_total)
+                bar = rng.randint(0, seen)
+                yield GroupCount(
+                    datetimecounted=datetimecounted,
+                    datecounted=timezone.localdate(datetimecounted),
+                    user=rng.choice(users),
+                    enclosure_id=group.enclosure_id,
+                    group=group,
+                    count_total=group.population_total,
+                    count_seen=seen,
+                    count_not_seen=group.population_total - seen,
+                    count_bar=bar,
+                    needs_attn=rng.random() < 0.05,
+                )
+
+    # species counts are for species w/o groups in the enclosure
+    enclosure_species = {(a.enclosure_id, a.species_id) for a in animals} - {
+        (g.enclosure_id, g.species_id) for g in groups
+    }
+
+    def species_counts():
+        for day in count_days(years):
+            for enclosure_id, species_id in enclosure_species:
+                datetimecounted = count_time(day, rng)
+                yield SpeciesCount(
+                    datetimecounted=datetimecounted,
+                    datecounted=timezone.localdate(datetimecounted),
+                    user=rng.choice(users),
+                    enclosure_id=enclosure_id,
+                    species_id=species_id,
+                    count=rng.randint(0, 20),
+                )
+
+    return {
+        "animal counts": bulk_create_batched(AnimalCount, animal_counts()),
+        "group counts": bulk_create_batched(GroupCount, group_counts()),
+        "species counts": bulk_create_batched(SpeciesCount, species_counts()),
+    }
+
+
+def create_zoo(
+    num_enclosures=5,
+    num_species=20,
+    num_animals=20,
+    num_groups=5,
+    years=3,
+    num_users=3,
+    prefix="synthetic",
+    seed=0,
+) -> dict:
+    """Creates a synthetic zoo
+
+    num_animals/num_groups are per enclosure
+
+    Returns a dict of the created objects and the number of counts of each type
+    """
+    rng = random.Random(seed)
+
+    users = create_users(num_users, prefix)
+    species = create_species(num_species, prefix)
+    enclosures = create_enclosures(num_enclosures, users, prefix)
+    animals, groups = create_animals_groups(
+        enclosures, species, num_animals, num_groups, rng
+    )
+    num_counts = create_counts(animals, groups, years, users, rng)
+
+    return {
+        "users": users,
+        "species": species,
+        "enclosures": enclosures,
+        "animals": animals,
+        "groups": groups,
+        "num_counts": num_counts,
+    }
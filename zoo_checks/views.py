@@ -1,18 +1,46 @@
 import logging
 
-import pandas as pd
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.paginator import Paginator
-from django.db.models import Count, Prefetch, Q
+from django.db import transaction
 from django.forms import formset_factory
-from django.http import HttpRequest, HttpResponse
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpRequest,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
 from django.utils import timezone
 
 from zoo_checks.ingest import TRACKS_REQ_COLS
 
+from .cache import (
+    get_accessible_enclosure_ids,
+    get_chart_data,
+    get_roster,
+    get_user_roles,
+    get_visible_enclosure_ids,
+)
+from .charts import (
+    CONDITION_WINDOWS,
+    animal_chart_data,
+    group_chart_data,
+    species_chart_data,
+)
+from .export import (
+    EXPORT_FORMATS,
+    STREAMED_FORMATS,
+    export_filename,
+    get_export_query,
+    iter_export_rows,
+    stream_csv,
+    stream_csv_gzip,
+)
 from .forms import (
     AnimalCountForm,
     ExportForm,
@@ -22,26 +50,28 @@ from .forms import (
     UploadFileForm,
 )
 from .helpers import (
-    clean_df,
     get_init_anim_count_form,
     get_init_group_count_form,
     get_init_spec_count_form,
-    qs_to_df,
     set_formset_order,
     today_time,
 )
-from .ingest import ExcelUploadError, handle_upload, ingest_changesets
+from .ingest import ExcelUploadError, handle_upload
 from .models import (
     Animal,
     AnimalCount,
+    DailyEnclosureSummary,
     Enclosure,
     Group,
     GroupCount,
+    Job,
     Role,
     Species,
     SpeciesCount,
+    StagedUpload,
     User,
 )
+from .pagination import InvalidCursor, KeysetPaginator
 
 baselogger = logging.getLogger("zootable")
 LOGGER = baselogger.getChild(__name__)
@@ -52,7 +82,7 @@ LOGGER = baselogger.getChild(__name__)
 def get_accessible_enclosures(user: User):
     # superuser sees all enclosures
     if not user.is_superuser:
-        enclosures = Enclosure.objects.filter(roles__in=user.roles.all()).distinct()
+        enclosures = Enclosure.objects.filter(id__in=get_accessible_enclosure_ids(user))
     else:
         enclosures = Enclosure.objects.all()
 
@@ -68,7 +98,9 @@ def redirect_if_not_permitted(request: HttpRequest, enclosure: Enclosure) -> boo
 
     False if user belongs to enclosure or is superuser
     """
-    if request.user.is_superuser or request.user.roles.filter(enclosures=enclosure):
+    if request.user.is_superuser or enclosure.id in get_accessible_enclosure_ids(
+        request.user
+    ):
         return False
 
     messages.error(
@@ -81,84 +113,20 @@ def redirect_if_not_permitted(request: HttpRequest, enclosure: Enclosure) -> boo
     return True
 
 
-def enclosure_counts_to_dict(enclosures, animal_counts, group_counts) -> dict:
-    """
-    repackage enclosure counts into dict for template render
-    dict order of enclosures is same as list/query order
-    not using defaultdict(list) because django templates have difficulty with them
-    """
+def get_history_page(request: HttpRequest, counts_query):
+    """a page of 10 counts, newest first, from the ?after=/?before= cursors
 
-    def create_counts_dict(enclosures, counts) -> dict:
-        """Takes a list/queryset of counts and enclosures
-
-        Returns a dictionary
-
-        - keys: enclosures
-        - values: list of counts belonging to the enclosure
-
-        We do this (once) in order to be able to iterate over counts for each enclosure
-        """
-        counts_dict = {}
-        for enc in enclosures:
-            counts_dict[enc] = []
-        [counts_dict[c.enclosure].append(c) for c in counts]
-        return counts_dict
-
-    def separate_conditions(counts) -> dict:
-        """
-        Arguments: Animal counts
-
-        Returns: dictionary
-
-        - keys: condition names
-        - values: list of counts
-        """
-        cond_dict = {}
-        for cond in AnimalCount.CONDITIONS:
-            cond_dict[cond[1]] = []  # init to empty list
-        [cond_dict[c.get_condition_display()].append(c) for c in counts]
-        return cond_dict
-
-    def separate_group_count_attributes(counts) -> dict:
-        """
-        Arguments: Group counts (typically w/in an enclosure)
-
-        Returns: dictionary
-
-        - keys: Seen, BAR, Needs Attn
-        - values: sum of group counts within each key
-        """
-        count_dict = {}
-        count_dict["Seen"] = sum([c.count_seen for c in counts])
-        count_dict["BAR"] = sum([c.count_bar for c in counts])
-        count_dict["Needs Attn"] = sum([c.needs_attn for c in counts])
-        return count_dict
-
-    enc_anim_ct_dict = create_counts_dict(enclosures, animal_counts)
-    enc_group_ct_dict = create_counts_dict(enclosures, group_counts)
-    counts_dict = {}
-    for enc in enclosures:
-        enc_anim_counts_sum = sum(
-            [
-                c.condition in [o_c[0] for o_c in AnimalCount.OBSERVED_CONDITIONS]
-                for c in enc_anim_ct_dict[enc]
-            ]
-        )
-        enc_group_counts_sum = sum(
-            [c.count_seen + c.count_bar for c in enc_group_ct_dict[enc]]
+    ?page=last for the oldest counts, an invalid cursor gets the first page
+    """
+    paginator = KeysetPaginator(counts_query, ("-datetimecounted", "-id"), 10)
+    try:
+        return paginator.page(
+            after=request.GET.get("after"),
+            before=request.GET.get("before"),
+            last=request.GET.get("page") == "last",
         )
-        total_groups = sum([g.population_total for g in enc.groups.all()])
-
-        counts_dict[enc] = {
-            "animal_count_total": enc_anim_counts_sum,
-            "animal_conditions": separate_conditions(enc_anim_ct_dict[enc]),
-            "group_counts": separate_group_count_attributes(enc_group_ct_dict[enc]),
-            "group_count_total": enc_group_counts_sum,
-            "total_animals": enc.animals.count(),
-            "total_groups": total_groups,
-        }
-
-    return counts_dict
+    except InvalidCursor:
+        return paginator.page()
 
 
 def get_selected_role(request: HttpRequest):
@@ -195,45 +163,44 @@ def get_selected_role(request: HttpRequest):
 
 @login_required
 # TODO: logins may not be sufficient - user a part of a group?
-# TODO: add pagination
 def home(request: HttpRequest):
-    enclosures_query = get_accessible_enclosures(request.user)
-
-    # only show enclosures that have active animals/groups
-    query = Q(animals__active=True) | Q(groups__active=True)
-
     selected_role = get_selected_role(request)
-    if selected_role is not None:
-        query = query & Q(roles=selected_role)
-
-    # prefetching in order to build up the info displayed for each enclosure
-    groups_prefetch = Prefetch("groups", queryset=Group.objects.filter(active=True))
-    animals_prefetch = Prefetch("animals", queryset=Animal.objects.filter(active=True))
 
-    enclosures_query = (
-        enclosures_query.prefetch_related(groups_prefetch, animals_prefetch)
-        .filter(query)
-        .distinct()
+    # only show enclosures that have active animals/groups
+    user = request.user
+    enclosure_ids = get_visible_enclosure_ids(
+        selected_role, lambda: Enclosure.visible_ids(role=selected_role)
     )
+    if not user.is_superuser:
+        accessible_ids = get_accessible_enclosure_ids(user)
+        enclosure_ids = [i for i in enclosure_ids if i in accessible_ids]
 
-    paginator = Paginator(enclosures_query, 10)
-    page = request.GET.get("page", 1)
-    enclosures = paginator.get_page(page)
+    # paginating the list of ids needs no COUNT(*)
+    paginator = Paginator(enclosure_ids, 10)
+    enclosures = paginator.get_page(request.GET.get("page", 1))
     page_range = range(
-        max(int(page) - 5, 1), min(int(page) + 5, paginator.num_pages) + 1
-    )
+        max(enclosures.number - 5, 1),
+        min(enclosures.number + 5, paginator.num_pages) + 1,
+    )
+    # only the page's enclosures, in the order of the ids
+    # (skipping any deleted since the ids were cached)
+    page_enclosures = Enclosure.objects.in_bulk(enclosures.object_list)
+    enclosures.object_list = [
+        page_enclosures[i] for i in enclosures.object_list if i in page_enclosures
+    ]
 
-    roles = request.user.roles.all()
+    roles = get_user_roles(request.user)
 
-    cts = Enclosure.all_counts(enclosures)
-    enclosure_cts_dict = enclosure_counts_to_dict(enclosures, *cts)
+    # one precomputed row per enclosure instead of aggregating the counts
+    summaries = DailyEnclosureSummary.for_enclosures(enclosures)
+    enclosure_summaries = {enc: summaries[enc.id] for enc in enclosures}
 
     return render(
         request,
         "home.html",
         {
             "enclosures": enclosures,
-            "cts_dict": enclosure_cts_dict,
+            "summaries": enclosure_summaries,
             "page_range": page_range,
             "roles": roles,
             "selected_role": selected_role,
@@ -258,18 +225,10 @@ def count(request: HttpRequest, enclosure_slug, year=None, month=None, day=None)
     else:
         count_today = False
 
-    enclosure_animals = (
-        enclosure.animals.filter(active=True)
-        .order_by("species__common_name", "name", "accession_number")
-        .select_related("species")
-    )
-    enclosure_groups = (
-        enclosure.groups.filter(active=True)
-        .order_by("species__common_name", "accession_number")
-        .select_related("species")
-    )
-
-    enclosure_species = enclosure.species().order_by("common_name")
+    roster = get_roster(enclosure)
+    enclosure_species = roster["species"]
+    enclosure_animals = roster["animals"]
+    enclosure_groups = roster["groups"]
 
     SpeciesCountFormset = formset_factory(SpeciesCountForm, extra=0)
 
@@ -292,20 +251,35 @@ def count(request: HttpRequest, enclosure_slug, year=None, month=None, day=None)
 
     # if this is a POST request we need to process the form data
     if request.method == "POST":
+        # the forms can only be for the enclosure's roster, validated without queries
+        def roster_kwargs(field, objs) -> dict:
+            return {
+                "roster": {
+                    field: {obj.id: obj for obj in objs},
+                    "enclosure": {enclosure.id: enclosure},
+                }
+            }
+
         # create a form instance and populate it with data from the request:
         species_formset = SpeciesCountFormset(
-            request.POST, initial=init_spec, prefix="species_formset"
+            request.POST,
+            initial=init_spec,
+            prefix="species_formset",
+            form_kwargs=roster_kwargs("species", enclosure_species),
         )
 
         groups_formset = GroupCountFormset(
-            request.POST, initial=init_group, prefix="groups_formset"
+            request.POST,
+            initial=init_group,
+            prefix="groups_formset",
+            form_kwargs=roster_kwargs("group", enclosure_groups),
         )
 
-        # TODO: Test to make sure we are editing the correct animal counts
         animals_formset = AnimalCountFormset(
             request.POST,
             initial=init_anim,
             prefix="animals_formset",
+            form_kwargs=roster_kwargs("animal", enclosure_animals),
         )
 
         # check whether it's valid:
@@ -315,27 +289,39 @@ def count(request: HttpRequest, enclosure_slug, year=None, month=None, day=None)
             and groups_formset.is_valid()
         ):
 
-            def save_form_in_formset(form):
-                # TODO: move this into model/(form?) and overwrite the save method
-                if form.has_changed():
-                    instance = form.save(commit=False)
-                    instance.user = request.user
+            def instance_from_form(form):
+                instance = form.save(commit=False)
+                instance.user = request.user
 
-                    # if setting count for a diff day than today, set the date/datetime
-                    if not count_today:
-                        instance.datetimecounted = (
-                            dateday
-                            + timezone.timedelta(days=1)
-                            - timezone.timedelta(seconds=1)
-                        )
-                        instance.datecounted = dateday.date()
+                # if setting count for a diff day than today, set the date/datetime
+                if not count_today:
+                    instance.datetimecounted = (
+                        dateday
+                        + timezone.timedelta(days=1)
+                        - timezone.timedelta(seconds=1)
+                    )
+                    instance.datecounted = dateday.date()
 
-                    instance.update_or_create_from_form()
+                return instance
 
             # process the data in form.cleaned_data as required
-            for formset in (species_formset, animals_formset, groups_formset):
-                for form in formset:
-                    save_form_in_formset(form)
+            # one upsert per count type, all or nothing
+            with transaction.atomic():
+                saved = []
+                for model, formset in (
+                    (SpeciesCount, species_formset),
+                    (AnimalCount, animals_formset),
+                    (GroupCount, groups_formset),
+                ):
+                    instances = [
+                        instance_from_form(form)
+                        for form in formset
+                        if form.has_changed()
+                    ]
+                    model.bulk_update_or_create_from_form(instances)
+                    saved.extend(instances)
+
+                DailyEnclosureSummary.refresh_for_counts(saved)
 
             messages.success(request, "Saved")
             LOGGER.info("Saved counts")
@@ -564,31 +550,12 @@ def animal_counts(request: HttpRequest, animal):
         .order_by("-datetimecounted", "-id")
     )
 
-    paginator = Paginator(animal_counts_query, 10)
-    page = request.GET.get("page", 1)
-    animal_counts_records = paginator.get_page(page)
-    page_range = range(
-        max(int(page) - 5, 1), min(int(page) + 5, paginator.num_pages) + 1
-    )
+    animal_counts_records = get_history_page(request, animal_counts_query)
 
-    # db counts each condition type
-    query_data = (
-        animal_counts_query.values("condition")
-        .order_by("condition")
-        .annotate(num=Count("condition"))
+    chart = get_chart_data(
+        "animal", animal_obj.id, lambda: animal_chart_data(animal_counts_query)
     )
 
-    # generating the data and labels
-    cond_slugs = [count["condition"] for count in query_data]
-    chart_data = []
-    for cond_slug, _ in AnimalCount.CONDITIONS:
-        if cond_slug in cond_slugs:
-            chart_data.append(query_data.get(condition=cond_slug)["num"])
-        else:
-            chart_data.append(0)
-    # gets the full name of the condition (from second item in tuple)
-    chart_labels = [c[1] for c in AnimalCount.CONDITIONS]
-
     return render(
         request,
         "animal_counts.html",
@@ -596,9 +563,11 @@ def animal_counts(request: HttpRequest, animal):
             "animal": animal_obj,
             "enclosure": enclosure,
             "animal_counts": animal_counts_records,
-            "chart_data": chart_data,
-            "chart_labels": chart_labels,
-            "page_range": page_range,
+            "conditions_url": reverse(
+                "api_animal_conditions", args=[animal_obj.accession_number]
+            ),
+            "condition_windows": CONDITION_WINDOWS,
+            **chart,
         },
     )
 
@@ -619,33 +588,12 @@ def group_counts(request: HttpRequest, group):
         .order_by("-datetimecounted", "-id")
     )
 
-    paginator = Paginator(group_counts_query, 10)
-    page = request.GET.get("page", 1)
-    group_counts_records = paginator.get_page(page)
-    page_range = range(
-        max(int(page) - 5, 1), min(int(page) + 5, paginator.num_pages) + 1
-    )
-
-    chart_labels_line = [
-        d.strftime("%m-%d-%Y")
-        for d in list(group_counts_query.values_list("datecounted", flat=True)[:100])
-    ]
-    chart_data_line_total = list(
-        group_counts_query.values_list("count_total", flat=True)[:100]
-    )
+    group_counts_records = get_history_page(request, group_counts_query)
 
-    chart_data_line_seen = list(
-        group_counts_query.values_list("count_seen", flat=True)[:100]
-    )
-    chart_data_line_bar = list(
-        group_counts_query.values_list("count_bar", flat=True)[:100]
+    chart = get_chart_data(
+        "group", group.id, lambda: group_chart_data(group_counts_query)
     )
 
-    # for the pie chart (last 100)
-    sum_counts = chart_data_line_seen
-    chart_labels_pie = sorted(set(sum_counts))
-    chart_data_pie = [sum_counts.count(s) for s in chart_labels_pie]
-
     return render(
         request,
         "group_counts.html",
@@ -653,13 +601,8 @@ def group_counts(request: HttpRequest, group):
             "group": group,
             "enclosure": enclosure,
             "counts": group_counts_records,
-            "chart_data_line_total": chart_data_line_total,
-            "chart_data_line_seen": chart_data_line_seen,
-            "chart_data_line_bar": chart_data_line_bar,
-            "chart_labels_line": chart_labels_line,
-            "chart_data_pie": chart_data_pie,
-            "chart_labels_pie": chart_labels_pie,
-            "page_range": page_range,
+            "history_url": reverse("api_group_history", args=[group.accession_number]),
+            **chart,
         },
     )
 
@@ -678,30 +621,15 @@ def species_counts(request: HttpRequest, species_slug, enclosure_slug):
         .order_by("-datetimecounted", "-id")
     )
 
-    paginator = Paginator(counts_query, 10)
-    page = request.GET.get("page", 1)
-    counts_records = paginator.get_page(page)
-    page_range = range(
-        max(int(page) - 5, 1), min(int(page) + 5, paginator.num_pages) + 1
-    )
+    counts_records = get_history_page(request, counts_query)
 
-    chart_labels_line = [
-        d.strftime("%m-%d-%Y")
-        for d in list(
-            counts_query.values_list("datecounted", flat=True).order_by(
-                "datetimecounted"
-            )[:100]
-        )
-    ]
-    chart_data_line_total = list(
-        counts_query.values_list("count", flat=True).order_by("datetimecounted")[:100]
+    chart = get_chart_data(
+        "species",
+        obj.id,
+        lambda: species_chart_data(counts_query),
+        enclosure_id=enclosure.id,
     )
 
-    # for the pie chart (last 100)
-    sum_counts = list(counts_query.values_list("count", flat=True)[:100])
-    chart_labels_pie = sorted(set(sum_counts))
-    chart_data_pie = [sum_counts.count(s) for s in chart_labels_pie]
-
     return render(
         request,
         "species_counts.html",
@@ -709,11 +637,10 @@ def species_counts(request: HttpRequest, species_slug, enclosure_slug):
             "obj": obj,
             "enclosure": enclosure,
             "counts": counts_records,
-            "chart_data_line_total": chart_data_line_total,
-            "chart_labels_line": chart_labels_line,
-            "chart_data_pie": chart_data_pie,
-            "chart_labels_pie": chart_labels_pie,
-            "page_range": page_range,
+            "history_url": reverse(
+                "api_species_history", args=[obj.slug, enclosure.slug]
+            ),
+            **chart,
         },
     )
 
@@ -787,56 +714,53 @@ def ingest_form(request: HttpRequest):
                 LOGGER.exception("Error processing uploaded data")
                 return redirect("ingest_form")
 
-            request.session["changesets"] = changesets
-            request.session["upload_file"] = str(request.FILES["file"])
+            # the session only has the token of the staged changesets
+            staged = StagedUpload.stage(
+                changesets, str(request.FILES["file"]), request.user
+            )
+            request.session["staged_upload"] = str(staged.token)
 
             # redirect to a confirmation page
             return redirect("confirm_upload")
 
     else:
         form = UploadFileForm()
-        request.session.pop("changesets", None)
-        request.session.pop("upload_file", None)
+        discard_staged_upload(request)
 
     return render(
         request, "upload_form.html", {"form": form, "req_cols": TRACKS_REQ_COLS}
     )
 
 
+def discard_staged_upload(request: HttpRequest):
+    """deletes the staged upload in the session"""
+    token = request.session.pop("staged_upload", None)
+    if token is not None:
+        StagedUpload.objects.filter(token=token).delete()
+
+
 @user_passes_test(lambda u: u.is_staff, redirect_field_name=None)
 def confirm_upload(request: HttpRequest):
     """after ingest form submit, show confirmation page before writing to db"""
-    changesets = request.session.get("changesets")
-    upload_file = request.session.get("upload_file")
-
-    if upload_file is None or changesets is None:
+    staged = StagedUpload.get_active(request.session.get("staged_upload"))
+    if staged is None:
         return redirect("ingest_form")
 
     # TODO: create a form w/ checkboxes for each change
     if request.method == "POST":
         # user clicked submit button on confirm_upload
 
-        # call functions in ingest.py to save the changes
-        try:
-            ingest_changesets(changesets)
-        except Exception as e:
-            messages.error(request, e)
-            LOGGER.error("error during data upload")
-            return redirect("ingest_form")
+        # a worker saves the changes, and deletes the staged upload
+        job = Job.enqueue("ingest", {"staged_upload": str(staged.token)}, request.user)
+        request.session.pop("staged_upload", None)
+        LOGGER.info("Queued data upload")
 
-        # clearing the changesets
-        request.session.pop("changesets", None)
-        request.session.pop("upload_file", None)
-
-        messages.success(request, "Saved")
-        LOGGER.info("Uploaded data")
-
-        return redirect("home")
+        return redirect("job", token=job.token)
 
     return render(
         request,
         "confirm_upload.html",
-        {"changesets": changesets, "upload_file": upload_file},
+        {"changesets": staged.changesets, "upload_file": staged.upload_file},
     )
 
 
@@ -858,48 +782,7 @@ def export(request: HttpRequest):
             start_date = form.cleaned_data["start_date"]
             end_date = form.cleaned_data["end_date"]
 
-            # TODO: abstract to a function that returns this for any model?
-            animal_counts = (
-                AnimalCount.objects.filter(
-                    enclosure__in=enclosures,
-                    datecounted__gte=start_date,
-                    datecounted__lte=end_date,
-                )
-                .order_by("datecounted", "animal_id", "datetimecounted")
-                .distinct("datecounted", "animal_id")
-            )
-            group_counts = (
-                GroupCount.objects.filter(
-                    enclosure__in=enclosures,
-                    datecounted__gte=start_date,
-                    datecounted__lte=end_date,
-                )
-                .order_by("datecounted", "group_id", "datetimecounted")
-                .distinct("datecounted", "group_id")
-            )
-            species_counts = (
-                SpeciesCount.objects.filter(
-                    enclosure__in=enclosures,
-                    datecounted__gte=start_date,
-                    datecounted__lte=end_date,
-                )
-                .order_by("datecounted", "species_id", "datetimecounted")
-                .distinct("datecounted", "species_id")
-            )
-
-            # convert to pandas dataframe
-            animal_counts_df = qs_to_df(animal_counts, AnimalCount._meta.fields)
-            group_counts_df = qs_to_df(group_counts, GroupCount._meta.fields)
-            species_counts_df = qs_to_df(species_counts, SpeciesCount._meta.fields)
-
-            # merge the dfs together
-            df_merge = pd.concat(
-                [animal_counts_df, group_counts_df, species_counts_df],
-                ignore_index=True,
-                sort=False,
-            )
-
-            if df_merge.empty:
+            if not get_export_query(enclosures, start_date, end_date).exists():
                 form.add_error(None, "No data in range")
                 extra = {
                     "enclosures": list(enclosures.values("id", "name")),
@@ -909,31 +792,34 @@ def export(request: HttpRequest):
                 LOGGER.error("no data to export for enclosures", extra=extra)
                 return render(request, "export.html", {"form": form})
 
-            df_merge_clean = clean_df(df_merge)
+            export_format = form.cleaned_data["export_format"]
+            file_format = EXPORT_FORMATS[export_format]
 
-            # create response object to save the data into
-            response = HttpResponse(
-                content_type=(
-                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            # csv is streamed as it's read from the database
+            if export_format in STREAMED_FORMATS:
+                stream = stream_csv_gzip if export_format == "csv.gz" else stream_csv
+                response = StreamingHttpResponse(
+                    stream(iter_export_rows(enclosures, start_date, end_date)),
+                    content_type=file_format["content_type"],
                 )
+                filename = export_filename(
+                    enclosures, start_date, end_date, file_format["ext"]
+                )
+                response["Content-Disposition"] = f'attachment; filename="{filename}"'
+                return response
+
+            # other files are written by a worker, downloaded from the job page
+            job = Job.enqueue(
+                "export",
+                {
+                    "enclosure_ids": [enc.id for enc in enclosures],
+                    "start_date": start_date.isoformat(),
+                    "end_date": end_date.isoformat(),
+                    "export_format": export_format,
+                },
+                request.user,
             )
-
-            enclosure_names = "_".join(enc.slug for enc in enclosures)
-            start_date_str = start_date.strftime("%Y%m%d")
-            end_date_str = end_date.strftime("%Y%m%d")
-            response["Content-Disposition"] = (
-                "attachment; "
-                'filename="zootable_export_'
-                f'{enclosure_names}_{start_date_str}_{end_date_str}.xlsx"'
-            )
-
-            # create xlsx object and put it into the response using pandas
-            with pd.ExcelWriter(response) as writer:
-                df_merge_clean.to_excel(writer, sheet_name="Sheet1", index=False)
-
-            # TODO: redirect to home w/ javascript serve xlsx file from that page
-            # send it to the user
-            return response
+            return redirect("job", token=job.token)
 
     else:
         form = ExportForm()
@@ -941,3 +827,52 @@ def export(request: HttpRequest):
         form.fields["selected_enclosures"].queryset = accessible_enclosures
 
     return render(request, "export.html", {"form": form})
+
+
+def get_user_job(request: HttpRequest, token) -> Job:
+    """users only see their own jobs"""
+    return get_object_or_404(Job, token=token, user=request.user)
+
+
+@login_required
+def job_detail(request: HttpRequest, token):
+    """progress of an ingest/export job, and its result when done"""
+    return render(request, "job.html", {"job": get_user_job(request, token)})
+
+
+@login_required
+def job_status(request: HttpRequest, token):
+    """polled by the job page while the job runs"""
+    job = get_user_job(request, token)
+    return JsonResponse(
+        {
+            "status": job.status,
+            "done": job.done,
+            "progress": job.progress,
+            "total": job.total,
+            "message": job.message,
+            "error": job.error,
+            "result": job.result,
+            "download_url": (
+                reverse("job_download", args=[job.token])
+                if job.result_filename
+                else None
+            ),
+        }
+    )
+
+
+@login_required
+def job_download(request: HttpRequest, token):
+    """the file of a finished export job"""
+    job = get_user_job(request, token)
+    if job.status != Job.SUCCEEDED or not job.result_filename:
+        raise Http404("No file for this job")
+
+    export_format = job.params.get("export_format", "xlsx")
+    return FileResponse(
+        job.result_file.open("rb"),
+        as_attachment=True,
+        filename=job.result_filename,
+        content_type=EXPORT_FORMATS[export_format]["content_type"],
+    )